@@ -0,0 +1,2 @@
+from .ball_tracker import BallTracker, BallKalmanFilter, fill_gaps
+from .ball_search import BallSearch
\ No newline at end of file
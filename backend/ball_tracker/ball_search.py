@@ -0,0 +1,122 @@
+import copy
+import numpy as np
+import supervision as sv
+import sys
+sys.path.append('../')
+from backend.track_table import TrackTable, make_rows
+from .ball_tracker import BallTracker
+
+class BallSearch:
+    """
+    Re-detects the ball at full resolution on frames where the detector missed it.
+
+    For every frame of a chunk without a ball, a search window is centered on
+    the Kalman prediction of the ball, growing with the prediction's
+    uncertainty, or on the last known ball position once the ball has been
+    lost for longer than max_gap frames. After max_lost_frames frames
+    without a ball (long occlusions, close-ups) the search stops until the
+    detector finds the ball again. The window is covered with
+    tile_size x tile_size crops of the full resolution frame, and the tiles of
+    all frames of the chunk are detected together in batches. The most
+    confident ball in a frame's tiles is kept.
+    """
+
+    def __init__(self, predict, tile_size=640, max_search_size=1280, batch_size=16, max_gap=25, max_lost_frames=50):
+        self.predict = predict
+        self.tile_size = tile_size
+        self.max_search_size = max_search_size
+        self.batch_size = batch_size
+        self.max_gap = max_gap
+        self.max_lost_frames = max_lost_frames
+        self.ball_tracker = BallTracker(max_gap=max_gap)
+        self.last_bbox = None
+        self.frames_lost = 0
+        self.stats = {"frames_searched": 0, "tiles": 0, "balls_found": 0}
+
+    def get_cache_params(self):
+        return {"tile_size": self.tile_size,
+                "max_search_size": self.max_search_size,
+                "max_gap": self.max_gap,
+                "max_lost_frames": self.max_lost_frames}
+
+    def _search_window(self, tracker, predicted_bbox):
+        if predicted_bbox is not None:
+            x1, y1, x2, y2 = predicted_bbox
+            sigma = np.sqrt(np.max(np.diag(tracker.kalman_filter.covariance)[:2]))
+            # +-3 sigma around the prediction plus room for the ball itself
+            size = min(6 * sigma + 64, self.max_search_size)
+        elif self.last_bbox is not None:
+            x1, y1, x2, y2 = self.last_bbox
+            size = self.max_search_size
+        else:
+            return None
+        return (x1 + x2) / 2, (y1 + y2) / 2, size
+
+    def _tile_origins(self, window, frame_shape):
+        center_x, center_y, size = window
+        frame_height, frame_width = frame_shape[:2]
+        tile_width, tile_height = min(self.tile_size, frame_width), min(self.tile_size, frame_height)
+        tiles_per_side = max(int(np.ceil(size / self.tile_size)), 1)
+        offsets = (np.arange(tiles_per_side) - tiles_per_side / 2) * self.tile_size
+        xs = np.clip(np.round(center_x + offsets), 0, frame_width - tile_width).astype(int)
+        ys = np.clip(np.round(center_y + offsets), 0, frame_height - tile_height).astype(int)
+        return sorted({(x, y) for x in xs.tolist() for y in ys.tolist()}), tile_width, tile_height
+
+    def search(self, frames, rows, start_frame):
+        """Search the frames of a chunk that have no ball in rows, returns the new ball rows"""
+        ball = TrackTable.object_index("ball")
+        is_ball = rows["object"] == ball
+        bboxes = np.full((len(frames), 4), np.nan)
+        bboxes[rows["frame"][is_ball] - start_frame] = rows["bbox"][is_ball]
+
+        # Plan the tiles on a copy of the tracker, the real one is updated with the final boxes below
+        planner = copy.deepcopy(self.ball_tracker)
+        frames_lost = self.frames_lost
+        tiles, tile_frames, tile_origins = [], [], []
+        for i, frame in enumerate(frames):
+            if not np.isnan(bboxes[i]).any():
+                planner.update(bboxes[i])
+                self.last_bbox = bboxes[i]
+                frames_lost = 0
+                continue
+            predicted_bbox, _ = planner.update(None)
+            frames_lost += 1
+            if frames_lost > self.max_lost_frames:
+                continue
+            window = self._search_window(planner, predicted_bbox)
+            if window is None:
+                continue
+            origins, tile_width, tile_height = self._tile_origins(window, frame.shape)
+            for x, y in origins:
+                tiles.append(frame[y:y + tile_height, x:x + tile_width])
+                tile_frames.append(i)
+                tile_origins.append((x, y))
+            self.stats["frames_searched"] += 1
+        self.stats["tiles"] += len(tiles)
+
+        best_confidence = np.zeros(len(frames))
+        found = np.zeros(len(frames), dtype=bool)
+        for batch_start in range(0, len(tiles), self.batch_size):
+            results = self.predict(tiles[batch_start:batch_start + self.batch_size])
+            for result, i, (x, y) in zip(results, tile_frames[batch_start:], tile_origins[batch_start:]):
+                detections = sv.Detections.from_ultralytics(result)
+                if len(detections) == 0:
+                    continue
+                best = np.argmax(detections.confidence)
+                if detections.confidence[best] > best_confidence[i]:
+                    best_confidence[i] = detections.confidence[best]
+                    bboxes[i] = detections.xyxy[best] + np.array([x, y, x, y])
+                    found[i] = True
+
+        for i in range(len(frames)):
+            if not np.isnan(bboxes[i]).any():
+                self.ball_tracker.update(bboxes[i])
+                self.last_bbox = bboxes[i]
+                self.frames_lost = 0
+            else:
+                self.ball_tracker.update(None)
+                self.frames_lost += 1
+
+        found_frames = np.flatnonzero(found)
+        self.stats["balls_found"] += len(found_frames)
+        return make_rows(ball, start_frame + found_frames, 1, bboxes[found_frames])
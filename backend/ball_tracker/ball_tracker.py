@@ -0,0 +1,133 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from backend.track_table import TrackTable, make_rows
+
+def fill_gaps(bboxes, max_gap=None):
+    """
+    Linearly interpolate missing (NaN) ball boxes over gaps of at most max_gap frames.
+
+    Gaps before the first and after the last detection are filled with the
+    nearest detection under the same limit. Longer gaps stay NaN and
+    max_gap=None fills everything. Returns (bboxes, estimated) where
+    estimated marks the filled frames.
+    """
+    bboxes = np.array(bboxes, dtype=np.float64).reshape(-1, 4)
+    missing = np.isnan(bboxes).any(axis=1)
+    known = np.flatnonzero(~missing)
+    if len(known) == 0:
+        return bboxes, np.zeros(len(bboxes), dtype=bool)
+
+    frames = np.arange(len(bboxes))
+    # np.interp holds the first/last value outside the known range, like bfill/ffill
+    interpolated = np.column_stack([np.interp(frames, known, bboxes[known, i]) for i in range(4)])
+
+    # Length of the gap every frame belongs to
+    next_known = np.searchsorted(known, frames)
+    gap_start = np.where(next_known > 0, known[np.maximum(next_known - 1, 0)] + 1, 0)
+    gap_end = np.where(next_known < len(known), known[np.minimum(next_known, len(known) - 1)], len(bboxes))
+    estimated = missing
+    if max_gap is not None:
+        estimated = missing & (gap_end - gap_start <= max_gap)
+
+    bboxes[estimated] = interpolated[estimated]
+    return bboxes, estimated
+
+class BallKalmanFilter:
+    """Constant velocity Kalman filter on the ball center, state (x, y, vx, vy) in pixels and pixels/frame"""
+
+    def __init__(self, center, process_noise=1.0, measurement_noise=4.0):
+        self.state = np.array([center[0], center[1], 0.0, 0.0])
+        self.covariance = np.diag([measurement_noise, measurement_noise, 100.0, 100.0])
+        self.transition = np.array([[1, 0, 1, 0],
+                                    [0, 1, 0, 1],
+                                    [0, 0, 1, 0],
+                                    [0, 0, 0, 1]], dtype=np.float64)
+        self.observation = np.eye(2, 4)
+        self.process_covariance = process_noise * np.diag([0.25, 0.25, 1.0, 1.0])
+        self.measurement_covariance = measurement_noise * np.eye(2)
+
+    def predict(self):
+        self.state = self.transition @ self.state
+        self.covariance = self.transition @ self.covariance @ self.transition.T + self.process_covariance
+        return self.state[:2]
+
+    def update(self, center):
+        innovation = np.asarray(center, dtype=np.float64) - self.observation @ self.state
+        innovation_covariance = self.observation @ self.covariance @ self.observation.T + self.measurement_covariance
+        gain = self.covariance @ self.observation.T @ np.linalg.inv(innovation_covariance)
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(4) - gain @ self.observation) @ self.covariance
+        return self.state[:2]
+
+class BallTracker:
+    """
+    Ball positions for frames where the detector missed the ball.
+
+    Online, update() is fed one frame at a time and bridges missing
+    detections with a constant velocity Kalman prediction for up to max_gap
+    frames. Offline, add_ball_positions_to_tracks() interpolates between the
+    detections on both sides of every gap of at most max_gap frames. In both
+    cases filled positions are marked as estimated and longer occlusions are
+    left empty instead of inventing a straight line across them.
+    """
+
+    def __init__(self, max_gap=25, process_noise=1.0, measurement_noise=4.0):
+        self.max_gap = max_gap
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self.kalman_filter = None
+        self.size = None
+        self.frames_missing = 0
+
+    def update(self, bbox):
+        """Next frame's ball detection (None if missing) -> (bbox, estimated), bbox is None once the ball is lost"""
+        if bbox is not None and not np.isnan(bbox).any():
+            x1, y1, x2, y2 = bbox
+            center = ((x1 + x2) / 2, (y1 + y2) / 2)
+            if self.kalman_filter is None:
+                self.kalman_filter = BallKalmanFilter(center, self.process_noise, self.measurement_noise)
+            else:
+                self.kalman_filter.predict()
+                self.kalman_filter.update(center)
+            self.size = (x2 - x1, y2 - y1)
+            self.frames_missing = 0
+            return list(bbox), False
+
+        if self.kalman_filter is None:
+            return None, False
+        self.frames_missing += 1
+        if self.frames_missing > self.max_gap:
+            self.reset()
+            return None, False
+
+        x, y = self.kalman_filter.predict()
+        width, height = self.size
+        return [float(x - width / 2), float(y - height / 2), float(x + width / 2), float(y + height / 2)], True
+
+    def add_ball_positions_to_tracks(self, tracks):
+        """Fill short gaps in tracks["ball"] in place, returns tracks"""
+        if isinstance(tracks, TrackTable):
+            ball_rows = tracks.rows("ball")
+            bboxes = np.full((tracks.num_frames, 4), np.nan)
+            bboxes[ball_rows["frame"]] = ball_rows["bbox"]
+        else:
+            bboxes = [frame.get(1, {}).get("bbox", [np.nan] * 4) for frame in tracks["ball"]]
+
+        bboxes, estimated = fill_gaps(bboxes, self.max_gap)
+        has_ball = ~np.isnan(bboxes).any(axis=1)
+
+        if isinstance(tracks, TrackTable):
+            frames = np.flatnonzero(has_ball)
+            rows = make_rows(TrackTable.object_index("ball"), frames, 1, bboxes[frames])
+            rows["estimated"] = estimated[frames]
+            tracks.replace_rows("ball", rows)
+            return tracks
+
+        for frame_num, ball_track in enumerate(tracks["ball"]):
+            if estimated[frame_num]:
+                ball_track[1] = {"bbox": bboxes[frame_num].tolist(), "estimated": True}
+        return tracks
@@ -1 +1,2 @@
-from .camera_movement_estimator import CameraMovementEstimator
\ No newline at end of file
+from .camera_movement_estimator import CameraMovementEstimator
+from .parallel_camera_movement import ParallelCameraMovement
\ No newline at end of file
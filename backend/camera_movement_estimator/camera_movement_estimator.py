@@ -1,13 +1,30 @@
-import pickle
 import cv2
 import numpy as np
-import os
 import sys 
 sys.path.append('../')
-from backend.utils import measure_distance,measure_xy_distance
+from backend.utils import iter_chunks
+from backend.track_table import TrackTable
+from backend.frame_annotator import blend_panel
+from .feature_tracks import FeatureTracks
+from .parallel_camera_movement import ParallelCameraMovement
+
+# How the per-frame movement is taken from the tracked features:
+# "max" follows the feature that moved the most, "median" the median displacement
+# and "ransac" the translation of a RANSAC similarity fit, the last two ignore outlier features
+ESTIMATORS = ("max", "median", "ransac")
+
+# Areas where features are tracked, as (x1, y1, x2, y2) fractions of the frame size:
+# the left edge and a band around the middle (columns 0:20 and 900:1050 of a 1920 wide frame)
+FEATURE_REGIONS = ((0.0, 0.0, 20/1920, 1.0), (900/1920, 0.0, 1050/1920, 1.0))
 
 class CameraMovementEstimator():
-    def __init__(self,frame):
+    def __init__(self,frame,estimator="max",scale=1.0,feature_regions=FEATURE_REGIONS,persistent_features=False):
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Unknown camera movement estimator '{estimator}', expected one of {ESTIMATORS}")
+        self.estimator = estimator
+        # Features are found and tracked on frames resized by scale, movement is reported in full resolution pixels
+        self.scale = scale
+        self.feature_regions = tuple(tuple(region) for region in feature_regions)
         self.minimum_distance = 5
 
         self.lk_params = dict(
@@ -16,10 +33,11 @@ class CameraMovementEstimator():
             criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT,10,0.03)
         )
 
-        first_frame_grayscale = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+        first_frame_grayscale = self.to_grayscale(frame)
         mask_features = np.zeros_like(first_frame_grayscale)
-        mask_features[:,0:20] = 1
-        mask_features[:,900:1050] = 1
+        height, width = mask_features.shape
+        for x1, y1, x2, y2 in self.feature_regions:
+            mask_features[int(round(y1*height)):int(round(y2*height)), int(round(x1*width)):int(round(x2*width))] = 1
 
         self.features = dict(
             maxCorners = 100,
@@ -29,7 +47,41 @@ class CameraMovementEstimator():
             mask = mask_features
         )
 
+        # Keep validated features across frames instead of detecting new ones after every movement
+        self.feature_tracks = FeatureTracks(self.features, self.lk_params) if persistent_features else None
+
+        self.old_gray = None
+        self.old_features = None
+
+    def get_cache_params(self):
+        features = {k:v for k,v in self.features.items() if k != 'mask'}
+        return {"minimum_distance": self.minimum_distance,
+                "estimator": self.estimator,
+                "lk_params": self.lk_params,
+                "features": features,
+                "scale": self.scale,
+                "feature_regions": self.feature_regions,
+                "feature_tracks": self.feature_tracks.get_cache_params() if self.feature_tracks is not None else None}
+
+    def to_grayscale(self,frame):
+        frame_gray = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            frame_gray = cv2.resize(frame_gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return frame_gray
+
+    @staticmethod
+    def add_adjust_positions_to_rows(rows, camera_movement_per_frame, start_frame=0):
+        # camera_movement_per_frame starts at frame start_frame, so a video can be adjusted range by range
+        camera_movement = np.asarray(camera_movement_per_frame, dtype=np.float64).reshape(-1,2)
+        position = rows['position'].astype(np.float64)
+        rows['position_adjusted'] = position - camera_movement[rows['frame'] - start_frame]
+
     def add_adjust_positions_to_tracks(self,tracks, camera_movement_per_frame):
+        if isinstance(tracks, TrackTable):
+            CameraMovementEstimator.add_adjust_positions_to_rows(tracks.data, camera_movement_per_frame)
+            tracks.computed.add('position_adjusted')
+            return
+
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
@@ -40,55 +92,106 @@ class CameraMovementEstimator():
                     
 
 
-    def get_camera_movement(self,frames,read_from_stub=False, stub_path=None):
-        # Read the stub 
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path,'rb') as f:
-                return pickle.load(f)
-
-        camera_movement = [[0,0]]*len(frames)
-
-        old_gray = cv2.cvtColor(frames[0],cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray,**self.features)
-
-        for frame_num in range(1,len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num],cv2.COLOR_BGR2GRAY)
-            new_features, _,_ = cv2.calcOpticalFlowPyrLK(old_gray,frame_gray,old_features,None,**self.lk_params)
+    def get_camera_movement(self,frames,chunk_size=64,num_workers=1):
+        # Cached by VideoAnalysisPipeline through StubCache, keyed by video content and get_cache_params
+        # A whole video, never continue from the last frame of a previous call
+        self.reset()
+        if num_workers > 1:
+            # Chunks are estimated in parallel, each starting over from the last frame of the chunk before it
+            with ParallelCameraMovement(self, num_workers, chunk_size) as parallel_camera_movement:
+                parallel_camera_movement.submit(frames)
+                camera_movement = parallel_camera_movement.result()
+        else:
+            camera_movement = []
+            for chunk in iter_chunks(frames, chunk_size):
+                self.update_camera_movement(camera_movement, chunk)
+            camera_movement = np.asarray(camera_movement, dtype=np.float64).reshape(-1,2)
 
-            max_distance = 0
-            camera_movement_x, camera_movement_y = 0,0
-
-            for i, (new,old) in enumerate(zip(new_features,old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
-
-                distance = measure_distance(new_features_point,old_features_point)
-                if distance>max_distance:
-                    max_distance = distance
-                    camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
-            
-            if max_distance > self.minimum_distance:
-                camera_movement[frame_num] = [camera_movement_x,camera_movement_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+        return camera_movement
 
-            old_gray = frame_gray.copy()
-        
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(camera_movement,f)
+    def reset(self):
+        # Forget the previous frame, the next frame starts a new sequence
+        self.old_gray = None
+        self.old_features = None
+        if self.feature_tracks is not None:
+            self.feature_tracks.points = self.feature_tracks.points[:0]
+
+    def update_camera_movement(self,camera_movement,frames):
+        # Estimate movement for a chunk of frames, continuing from the last frame of the previous chunk
+        return self.update_camera_movement_grayscale(camera_movement, (self.to_grayscale(frame) for frame in frames))
+
+    def update_camera_movement_grayscale(self,camera_movement,frames_gray):
+        # Same as update_camera_movement for frames already passed through to_grayscale
+        if self.feature_tracks is not None:
+            return self._update_with_feature_tracks(camera_movement, frames_gray)
+
+        for frame_gray in frames_gray:
+            if self.old_gray is None:
+                self.old_gray = frame_gray
+                self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+                camera_movement.append([0,0])
+                continue
+
+            if self.old_features is None:
+                # Nothing to follow on a featureless frame, look again on this one
+                self.old_gray = frame_gray
+                self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+                camera_movement.append([0,0])
+                continue
+
+            new_features, _,_ = cv2.calcOpticalFlowPyrLK(self.old_gray,frame_gray,self.old_features,None,**self.lk_params)
+            distance, movement = self.estimate_movement(self.old_features.reshape(-1,2)/self.scale,
+                                                        new_features.reshape(-1,2)/self.scale)
+
+            if distance > self.minimum_distance:
+                camera_movement.append(movement)
+                self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+            else:
+                camera_movement.append([0,0])
+
+            self.old_gray = frame_gray
 
         return camera_movement
     
-    def draw_camera_movement(self,frames, camera_movement_per_frame):
+    def _update_with_feature_tracks(self,camera_movement,frames_gray):
+        for frame_gray in frames_gray:
+            if self.old_gray is None:
+                self.feature_tracks.detect(frame_gray)
+                camera_movement.append([0,0])
+            else:
+                old_points, new_points = self.feature_tracks.track(self.old_gray, frame_gray)
+                distance, movement = 0, [0,0]
+                if len(old_points) > 0:
+                    distance, movement = self.estimate_movement(old_points/self.scale, new_points/self.scale)
+                camera_movement.append(movement if distance > self.minimum_distance else [0,0])
+
+            self.old_gray = frame_gray
+
+        return camera_movement
+
+    def estimate_movement(self,old_points,new_points):
+        """Camera movement between two frames from (n, 2) arrays of matched feature positions, returns (distance, [x, y])"""
+        displacement = old_points - new_points
+        if self.estimator == "max":
+            distances = np.hypot(displacement[:,0], displacement[:,1])
+            strongest = np.argmax(distances)
+            return float(distances[strongest]), displacement[strongest].tolist()
+
+        movement = np.median(displacement, axis=0)
+        if self.estimator == "ransac" and len(old_points) >= 2:
+            transform, _ = cv2.estimateAffinePartial2D(old_points, new_points, method=cv2.RANSAC, ransacReprojThreshold=3.0)
+            if transform is not None:
+                # Translation of the fit at the center of the features, so rotation and zoom do not leak into it
+                center = old_points.mean(axis=0)
+                movement = center - (transform[:,:2] @ center + transform[:,2])
+        return float(np.hypot(*movement)), movement.tolist()
+
+    def draw_camera_movement(self,frames, camera_movement_per_frame, start_frame=0):
         output_frames=[]
 
-        for frame_num, frame in enumerate(frames):
+        for frame_num, frame in enumerate(frames, start_frame):
             frame= frame.copy()
-
-            overlay = frame.copy()
-            cv2.rectangle(overlay,(0,0),(500,100),(255,255,255),-1)
-            alpha =0.6
-            cv2.addWeighted(overlay,alpha,frame,1-alpha,0,frame)
+            blend_panel(frame,(0,0),(500,100),alpha=0.6)
 
             x_movement, y_movement = camera_movement_per_frame[frame_num]
             frame = cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
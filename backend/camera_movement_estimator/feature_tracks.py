@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+class FeatureTracks:
+    """
+    Feature points followed across frames for camera movement estimation.
+
+    Points are tracked from frame to frame with LK and kept as long as
+    they track well: LK must find them (status), and tracking them back
+    from the new frame must land within max_fb_error pixels of where they
+    started (forward-backward check). goodFeaturesToTrack only runs again
+    once fewer than min_features points survive.
+    """
+
+    def __init__(self, feature_params, lk_params, min_features=30, max_fb_error=1.0):
+        self.feature_params = feature_params
+        self.lk_params = lk_params
+        self.min_features = min_features
+        self.max_fb_error = max_fb_error
+        self.points = np.empty((0, 1, 2), dtype=np.float32)
+        self.stats = {"frames": 0, "detections": 0, "tracked": 0, "dropped": 0}
+
+    def get_cache_params(self):
+        return {"min_features": self.min_features, "max_fb_error": self.max_fb_error}
+
+    def detect(self, frame_gray):
+        points = cv2.goodFeaturesToTrack(frame_gray, **self.feature_params)
+        self.points = points if points is not None else np.empty((0, 1, 2), dtype=np.float32)
+        self.stats["detections"] += 1
+
+    def track(self, previous_gray, frame_gray):
+        """Follow the points into frame_gray, returns the (n, 2) old and new positions of the points that survived"""
+        self.stats["frames"] += 1
+        old_points = self.points
+        if len(old_points) > 0:
+            new_points, status, _ = cv2.calcOpticalFlowPyrLK(previous_gray, frame_gray, old_points, None, **self.lk_params)
+            back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(frame_gray, previous_gray, new_points, None, **self.lk_params)
+            fb_error = np.linalg.norm((back_points - old_points).reshape(-1, 2), axis=1)
+            keep = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+            old_points, new_points = old_points[keep], new_points[keep]
+        else:
+            new_points = old_points
+        self.stats["tracked"] += len(new_points)
+        self.stats["dropped"] += len(self.points) - len(new_points)
+
+        self.points = new_points
+        if len(self.points) < self.min_features:
+            self.detect(frame_gray)
+        return old_points.reshape(-1, 2), new_points.reshape(-1, 2)
@@ -0,0 +1,142 @@
+import copy
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+import numpy as np
+
+_worker_estimator = None
+
+def _init_worker(estimator):
+    global _worker_estimator
+    import cv2
+    # One OpenCV thread per worker, the pool provides the parallelism
+    cv2.setNumThreads(1)
+    _worker_estimator = estimator
+
+def _estimate_chunk(shm_name, shape, overlap):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames_gray = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        estimator = copy.deepcopy(_worker_estimator)
+        estimator.reset()
+        camera_movement = []
+        estimator.update_camera_movement_grayscale(camera_movement, frames_gray)
+        del frames_gray
+        # The overlap frames only set up the previous frame for the first frame of the chunk
+        return np.asarray(camera_movement, dtype=np.float64).reshape(-1, 2)[overlap:]
+    finally:
+        shm.close()
+
+class ParallelCameraMovement:
+    """
+    Estimates camera movement for chunks of frames in a pool of worker processes.
+
+    Frames are converted with the estimator's to_grayscale in the parent and
+    gathered into chunks of chunk_size, each copied once into a
+    shared-memory slot together with the last overlap frames of the chunk
+    before it. Movement only depends on adjacent frames, so every worker
+    starts from scratch on its overlap frames and the chunks are stitched
+    back in order into one (num_frames, 2) array, or handed out by collect()
+    as they finish. At most max_pending chunks are in flight, which bounds the
+    memory used on long videos.
+    """
+
+    def __init__(self, estimator, num_workers=None, chunk_size=64, overlap=1, max_pending=None):
+        self.estimator = estimator
+        self.num_workers = num_workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.max_pending = max_pending or 2 * self.num_workers
+        template = copy.deepcopy(estimator)
+        template.reset()
+        self.executor = ProcessPoolExecutor(self.num_workers,
+                                            mp_context=get_context('spawn'),
+                                            initializer=_init_worker,
+                                            initargs=(template,))
+        self._buffer = []
+        self._previous = []
+        self._pending = deque()
+        self._results = []
+        self._num_collected = 0
+        self._num_returned = 0
+        self._free_slots = []
+        self._slots = []
+
+    def _acquire_slot(self, nbytes):
+        for i, slot in enumerate(self._free_slots):
+            if slot.size >= nbytes:
+                return self._free_slots.pop(i)
+        slot = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._slots.append(slot)
+        return slot
+
+    def _collect(self):
+        slot, future = self._pending.popleft()
+        try:
+            self._results.append(future.result())
+            self._num_collected += len(self._results[-1])
+        finally:
+            self._free_slots.append(slot)
+
+    def _dispatch(self):
+        frames_gray = self._previous + self._buffer
+        overlap = len(self._previous)
+        shape = (len(frames_gray),) + frames_gray[0].shape
+        slot = self._acquire_slot(int(np.prod(shape)))
+        buffer = np.ndarray(shape, dtype=np.uint8, buffer=slot.buf)
+        np.stack(frames_gray, out=buffer)
+        del buffer
+        self._pending.append((slot, self.executor.submit(_estimate_chunk, slot.name, shape, overlap)))
+        self._previous = self._buffer[-self.overlap:] if self.overlap > 0 else []
+        self._buffer = []
+        while len(self._pending) > self.max_pending:
+            self._collect()
+
+    def submit(self, frames):
+        """Add frames in video order, full chunks are handed to the workers right away"""
+        for frame in frames:
+            self._buffer.append(self.estimator.to_grayscale(frame))
+            if len(self._buffer) >= self.chunk_size:
+                self._dispatch()
+
+    def collect(self, num_frames=None):
+        """
+        Movement of the frames finished since the last call, in order, e.g. to use it while frames are still submitted.
+
+        Waits until the first num_frames submitted frames are done or no chunk
+        is in flight anymore, frames still gathering into a chunk are not
+        dispatched. With num_frames None the last partial chunk is dispatched
+        and every frame is waited for.
+        """
+        if num_frames is None:
+            if self._buffer:
+                self._dispatch()
+            num_frames = np.inf
+        while self._pending and self._num_collected < num_frames:
+            self._collect()
+        results = self._results[self._num_returned:]
+        self._num_returned = len(self._results)
+        return np.concatenate(results) if results else np.zeros((0, 2))
+
+    def result(self):
+        """Wait for every submitted frame and return the (num_frames, 2) camera movement"""
+        if self._buffer:
+            self._dispatch()
+        while self._pending:
+            self._collect()
+        return np.concatenate(self._results) if self._results else np.zeros((0, 2))
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        self._slots = []
+        self._free_slots = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
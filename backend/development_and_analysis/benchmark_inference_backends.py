@@ -0,0 +1,100 @@
+"""
+Compare detector throughput and output agreement across inference backends.
+
+Usage (from the repository root):
+    python -m backend.development_and_analysis.benchmark_inference_backends input_videos/match.mp4 \
+        --backends torch onnx onnx-int8 openvino openvino-int8 --frames 128
+
+PyTorch is the reference. For every other backend, detections are matched
+to the reference per frame and class by IoU, and recall/precision/mean IoU
+of those matches are reported next to frames per second.
+"""
+import argparse
+import time
+from itertools import islice
+import numpy as np
+import supervision as sv
+import sys
+sys.path.append('../')
+from backend.utils import iter_video_frames
+from backend.trackers import Tracker
+
+def box_iou(boxes_a, boxes_b):
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """Greedy same-class IoU matching of two sv.Detections, returns (matched IoUs, reference count, candidate count)"""
+    ref_boxes, ref_classes = reference.xyxy, reference.class_id
+    cand_boxes, cand_classes = candidate.xyxy, candidate.class_id
+    matched_ious = []
+    for class_id in np.union1d(ref_classes, cand_classes):
+        a, b = ref_boxes[ref_classes == class_id], cand_boxes[cand_classes == class_id]
+        if len(a) == 0 or len(b) == 0:
+            continue
+        ious = box_iou(a, b)
+        while True:
+            i, j = np.unravel_index(np.argmax(ious), ious.shape)
+            if ious[i, j] < iou_threshold:
+                break
+            matched_ious.append(ious[i, j])
+            ious[i, :] = -1
+            ious[:, j] = -1
+    return matched_ious, len(ref_boxes), len(cand_boxes)
+
+def agreement(reference, detections, iou_threshold=0.5):
+    """(recall, precision, mean IoU) of per-frame detections against reference detections"""
+    matched_ious, reference_count, candidate_count = [], 0, 0
+    for reference_detection, detection in zip(reference, detections):
+        ious, n_reference, n_candidate = match_detections(reference_detection, detection, iou_threshold)
+        matched_ious += ious
+        reference_count += n_reference
+        candidate_count += n_candidate
+    recall = len(matched_ious) / max(reference_count, 1)
+    precision = len(matched_ious) / max(candidate_count, 1)
+    mean_iou = float(np.mean(matched_ious)) if matched_ious else 0.0
+    return recall, precision, mean_iou
+
+def run_backend(model_path, backend, frames, batch_size, video_path):
+    name, _, precision = backend.partition('-')
+    tracker = Tracker(model_path, name, int8=precision == 'int8', calibration_video=video_path)
+    tracker._predict_batch(frames[:1])  # warm-up
+
+    detections = []
+    start_time = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        detections += tracker._predict_batch(frames[i:i+batch_size])
+    elapsed = time.perf_counter() - start_time
+    return [sv.Detections.from_ultralytics(detection) for detection in detections], len(frames) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("video")
+    parser.add_argument("--model", default="backend/models/football-player-detection.pt")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8", "openvino", "openvino-int8"])
+    parser.add_argument("--frames", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    frames = list(islice(iter_video_frames(args.video), args.frames))
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+
+    reference = None
+    print(f"{'backend':<16}{'fps':>8}{'recall':>9}{'precision':>11}{'mean IoU':>10}")
+    for backend in backends:
+        detections, fps = run_backend(args.model, backend, frames, args.batch_size, args.video)
+        if reference is None:
+            reference = detections
+            print(f"{backend:<16}{fps:>8.1f}{'-':>9}{'-':>11}{'-':>10}")
+            continue
+
+        recall, precision, mean_iou = agreement(reference, detections, args.iou)
+        print(f"{backend:<16}{fps:>8.1f}{recall:>9.3f}{precision:>11.3f}{mean_iou:>10.3f}")
+
+if __name__ == "__main__":
+    main()
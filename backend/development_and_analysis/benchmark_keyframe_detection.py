@@ -0,0 +1,66 @@
+"""
+Accuracy-vs-speed tradeoff of keyframe detection with optical flow propagation.
+
+Usage (from the repository root):
+    python -m backend.development_and_analysis.benchmark_keyframe_detection input_videos/match.mp4 \
+        --intervals 1 2 3 5 8 --frames 240
+
+Detection on every frame (interval 1) is the reference. For every keyframe
+interval the report shows frames per second, how many frames went through
+the detector, and the recall/precision/mean IoU of the resulting boxes
+against the reference.
+"""
+import argparse
+import time
+from itertools import islice
+import supervision as sv
+import sys
+sys.path.append('../')
+from backend.utils import iter_video_frames, iter_chunks
+from backend.trackers import Tracker, KeyframeDetector
+from backend.development_and_analysis.benchmark_inference_backends import agreement
+
+def run_interval(tracker, frames, keyframe_interval, chunk_size):
+    tracker.keyframe_detector = None
+    if keyframe_interval > 1:
+        tracker.keyframe_detector = KeyframeDetector(tracker.detect_every_frame, keyframe_interval)
+
+    detections = []
+    start_time = time.perf_counter()
+    for chunk in iter_chunks(frames, chunk_size):
+        detections += tracker.detect_frames(chunk)
+    elapsed = time.perf_counter() - start_time
+
+    if tracker.keyframe_detector is None:
+        detections = [sv.Detections.from_ultralytics(detection) for detection in detections]
+        detected = len(frames)
+    else:
+        detected = tracker.keyframe_detector.stats["detected"]
+    return detections, len(frames) / elapsed, detected
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("video")
+    parser.add_argument("--model", default="backend/models/football-player-detection.pt")
+    parser.add_argument("--intervals", nargs="+", type=int, default=[1, 2, 3, 5, 8])
+    parser.add_argument("--frames", type=int, default=240)
+    parser.add_argument("--chunk-size", type=int, default=32)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    frames = list(islice(iter_video_frames(args.video), args.frames))
+    tracker = Tracker(args.model)
+    tracker.detect_every_frame(frames[:1])  # warm-up and batch size calibration
+
+    intervals = [1] + [interval for interval in args.intervals if interval > 1]
+    reference = None
+    print(f"{'interval':<10}{'fps':>8}{'detected':>10}{'recall':>9}{'precision':>11}{'mean IoU':>10}")
+    for interval in intervals:
+        detections, fps, detected = run_interval(tracker, frames, interval, args.chunk_size)
+        if reference is None:
+            reference = detections
+        recall, precision, mean_iou = agreement(reference, detections, args.iou)
+        print(f"{interval:<10}{fps:>8.1f}{detected / len(frames):>10.0%}{recall:>9.3f}{precision:>11.3f}{mean_iou:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+from .drawing import draw_ellipse, draw_triangle, blend_panel
+from .sprite_cache import SpriteCache
+from .frame_annotator import FrameAnnotator, LAYERS
+from .hud_timeline import HudTimeline
\ No newline at end of file
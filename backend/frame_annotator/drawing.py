@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from backend.utils import get_center_of_bbox, get_bbox_width
+
+def ellipse_marker(frame, x, y, axes, color):
+    """Arc under a player centered on its foot point (x, y)"""
+    cv2.ellipse(frame,
+                center=(x, y),
+                axes=axes,
+                angle=0.0,
+                startAngle=-45,
+                endAngle=235,
+                color=color,
+                thickness=2,
+                lineType=cv2.LINE_4)
+    return frame
+
+def id_label(frame, x, y, color, track_id):
+    """Track ID box below the ellipse centered on (x, y)"""
+    rectangle_width, rectangle_height = 40, 20
+    x1_rect = x - rectangle_width // 2
+    x2_rect = x + rectangle_width // 2
+    y1_rect = (y - rectangle_height // 2) + 15
+    y2_rect = (y + rectangle_height // 2) + 15
+    cv2.rectangle(frame, (int(x1_rect), int(y1_rect)), (int(x2_rect), int(y2_rect)), color, cv2.FILLED)
+
+    x1_text = x1_rect + 12
+    if track_id > 99:
+        x1_text -= 10
+    cv2.putText(frame, f"{track_id}", (int(x1_text), int(y1_rect + 15)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+    return frame
+
+def triangle_marker(frame, x, y, color):
+    """Filled triangle pointing down at (x, y)"""
+    triangle_points = np.array([[x, y], [x - 10, y - 20], [x + 10, y - 20]])
+    cv2.drawContours(frame, [triangle_points], 0, color, cv2.FILLED)
+    cv2.drawContours(frame, [triangle_points], 0, (0, 0, 0), 2)
+    return frame
+
+def draw_ellipse(frame, bbox, color, track_id=None):
+    x_center, _ = get_center_of_bbox(bbox)
+    y2 = int(bbox[3])
+    width = get_bbox_width(bbox)
+    ellipse_marker(frame, x_center, y2, (int(width), int(0.35 * width)), color)
+    if track_id is not None:
+        id_label(frame, x_center, y2, color, track_id)
+    return frame
+
+def draw_triangle(frame, bbox, color):
+    x, _ = get_center_of_bbox(bbox)
+    return triangle_marker(frame, x, int(bbox[1]), color)
+
+def blend_panel(frame, top_left, bottom_right, color=(255, 255, 255), alpha=0.4):
+    """Blend a translucent filled rectangle into frame in place, only its pixels are touched"""
+    height, width = frame.shape[:2]
+    x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+    # Inclusive corners, as with cv2.rectangle
+    x2, y2 = min(bottom_right[0] + 1, width), min(bottom_right[1] + 1, height)
+    if x1 >= x2 or y1 >= y2:
+        return frame
+    roi = frame[y1:y2, x1:x2]
+    if len(set(color)) == 1:
+        # Gray panels blend with a scalar offset, without a color image of the panel's size
+        cv2.addWeighted(roi, 1 - alpha, roi, 0, alpha * color[0], dst=roi)
+    else:
+        cv2.addWeighted(np.full_like(roi, color), alpha, roi, 1 - alpha, 0, dst=roi)
+    return frame
@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from backend.utils import get_center_of_bbox, get_bbox_width, get_foot_position
+from .drawing import blend_panel
+from .sprite_cache import SpriteCache
+
+# Drawn in this order, later layers end up on top
+LAYERS = ("players", "referees", "ball", "ball_control", "camera_movement", "speed_and_distance")
+
+class FrameAnnotator:
+    """
+    Draws all overlays of the output video in one pass over each frame.
+
+    Frames are annotated in place, so decoded frames become output frames
+    without full-frame copies, and translucent panels are blended over
+    their own rectangle only. Each layer of LAYERS can be switched on or
+    off. Track rows are read from the TrackTable one chunk at a time and
+    panel values from a HudTimeline, so drawing a frame does not depend on
+    how many frames came before it. Markers and labels are blitted from a
+    SpriteCache instead of being rasterized for every detection.
+    """
+
+    def __init__(self, layers=None, sprite_cache=None):
+        self.sprite_cache = sprite_cache if sprite_cache is not None else SpriteCache()
+        self.layers = set()
+        for layer in LAYERS if layers is None else layers:
+            self.set_layer(layer, True)
+
+    def set_layer(self, layer, enabled):
+        if layer not in LAYERS:
+            raise ValueError(f"Unknown annotation layer '{layer}', expected one of {LAYERS}")
+        if enabled:
+            self.layers.add(layer)
+        else:
+            self.layers.discard(layer)
+
+    def _frame_rows(self, tracks, object_name, start_frame, stop_frame, fields):
+        # Per-frame lists of the given fields of one object, converted from the table once per chunk
+        rows = tracks.rows(object_name, start_frame, stop_frame)
+        bounds = np.searchsorted(rows['frame'], np.arange(start_frame, stop_frame + 1)).tolist()
+        columns = [rows[field].tolist() for field in fields]
+        return [list(zip(*(column[bounds[i]:bounds[i + 1]] for column in columns)))
+                for i in range(stop_frame - start_frame)]
+
+    def _draw_ellipse(self, frame, bbox, color, track_id=None):
+        x_center, _ = get_center_of_bbox(bbox)
+        y2 = int(bbox[3])
+        width = get_bbox_width(bbox)
+        self.sprite_cache.ellipse(frame, x_center, y2, (int(width), int(0.35 * width)), color)
+        if track_id is not None:
+            self.sprite_cache.id_label(frame, x_center, y2, color, track_id)
+
+    def _draw_triangle(self, frame, bbox, color):
+        x, _ = get_center_of_bbox(bbox)
+        self.sprite_cache.triangle(frame, x, int(bbox[1]), color)
+
+    def draw(self, frames, tracks, hud_timeline, start_frame=0):
+        """Draw the enabled layers onto frames in place, start_frame is the index of frames[0] in tracks"""
+        stop_frame = start_frame + len(frames)
+        players = self._frame_rows(tracks, 'players', start_frame, stop_frame,
+                                   ('track_id', 'bbox', 'team', 'team_color', 'has_ball', 'speed', 'distance'))
+        referees = self._frame_rows(tracks, 'referees', start_frame, stop_frame, ('bbox',))
+        balls = self._frame_rows(tracks, 'ball', start_frame, stop_frame, ('bbox',))
+
+        for i, frame in enumerate(frames):
+            frame_num = start_frame + i
+            if 'players' in self.layers:
+                for track_id, bbox, team, team_color, has_ball, _, _ in players[i]:
+                    self._draw_ellipse(frame, bbox, tuple(team_color) if team != 0 else (0, 0, 255), track_id)
+                    if has_ball:
+                        self._draw_triangle(frame, bbox, (0, 0, 255))
+
+            if 'referees' in self.layers:
+                for bbox, in referees[i]:
+                    self._draw_ellipse(frame, bbox, (0, 255, 255))
+
+            if 'ball' in self.layers:
+                for bbox, in balls[i]:
+                    self._draw_triangle(frame, bbox, (0, 255, 0))
+
+            if 'ball_control' in self.layers:
+                self.draw_ball_control(frame, hud_timeline.ball_control_text(frame_num))
+
+            if 'camera_movement' in self.layers:
+                self.draw_camera_movement(frame, hud_timeline.camera_movement_text(frame_num))
+
+            if 'speed_and_distance' in self.layers:
+                for _, bbox, _, _, _, speed, distance in players[i]:
+                    if np.isnan(speed) or np.isnan(distance):
+                        continue
+                    x, y = get_foot_position(bbox)
+                    self.sprite_cache.text(frame, f"{speed:.2f} km/h", x, y + 40)
+                    self.sprite_cache.text(frame, f"{distance:.2f} m", x, y + 60)
+
+        return frames
+
+    def draw_ball_control(self, frame, lines):
+        blend_panel(frame, (1350, 850), (1900, 970), alpha=0.4)
+        for line, y in zip(lines, (900, 950)):
+            cv2.putText(frame, line, (1400, y), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+        return frame
+
+    def draw_camera_movement(self, frame, lines):
+        blend_panel(frame, (0, 0), (500, 100), alpha=0.6)
+        for line, y in zip(lines, (30, 60)):
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+        return frame
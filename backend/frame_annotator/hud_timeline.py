@@ -0,0 +1,100 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from backend.track_table import TrackTable
+
+class HudTimeline:
+    """
+    Per-frame overlay values of a whole video, computed once.
+
+    Cumulative ball control comes from prefix sums of the per-frame
+    possession and camera movement is stored as a (num_frames, 2) array,
+    so looking up any frame is O(1) for the annotator as well as for the
+    GUI. Ball control is 0% for both teams until either team had the ball.
+    A streaming pipeline can start empty and extend() the timeline range by
+    range, the prefix sums then continue from the last frame. Frames already
+    added never change, so they can be read while later ones are appended.
+    """
+
+    def __init__(self, team_ball_control=(), camera_movement_per_frame=(), tracks=None):
+        self._length = 0
+        self._capacity = 0
+        self._allocate(0)
+        self.extend(team_ball_control, camera_movement_per_frame)
+
+        # Objects on screen per frame, straight from the table's frame offsets
+        self.object_counts = None
+        if tracks is not None:
+            self.set_object_counts(tracks)
+
+    def _allocate(self, capacity):
+        # Grows by doubling, so extending frame range by frame range copies every frame O(1) times
+        previous = {name: getattr(self, f"_{name}", None)
+                    for name in ("possession", "controlled_frames", "ball_control", "camera_movement", "total_camera_movement")}
+        self._possession = np.zeros(capacity, dtype=np.int8)
+        self._controlled_frames = np.zeros((capacity, 2), dtype=np.int64)
+        self._ball_control = np.zeros((capacity, 2))
+        self._camera_movement = np.zeros((capacity, 2))
+        self._total_camera_movement = np.zeros((capacity, 2))
+        for name, array in previous.items():
+            if array is not None:
+                getattr(self, f"_{name}")[:self._length] = array[:self._length]
+        self._capacity = capacity
+
+    def extend(self, team_ball_control, camera_movement_per_frame):
+        """Append the values of the next frames, both arguments hold one entry per frame"""
+        control = np.asarray(team_ball_control)
+        camera_movement = np.asarray(camera_movement_per_frame, dtype=np.float64).reshape(-1, 2)
+        start, stop = self._length, self._length + len(control)
+        if stop > self._capacity:
+            self._allocate(max(stop, 2 * self._capacity))
+
+        possession = np.where(control == 1, 1, np.where(control == 2, 2, 0)).astype(np.int8)
+        self._possession[start:stop] = possession
+        controlled_frames = np.stack([np.cumsum(possession == 1), np.cumsum(possession == 2)], axis=1).reshape(-1, 2)
+        if start > 0:
+            controlled_frames += self._controlled_frames[start - 1]
+        self._controlled_frames[start:stop] = controlled_frames
+        total = controlled_frames.sum(axis=1, keepdims=True)
+        ball_control = np.zeros((len(control), 2))
+        np.divide(controlled_frames, total, out=ball_control, where=total > 0)
+        self._ball_control[start:stop] = ball_control
+
+        self._camera_movement[start:stop] = camera_movement
+        # cumsum adds frame by frame, so continuing it from the last total gives the same values
+        self._total_camera_movement[start:stop] = np.cumsum(np.concatenate([self._total_camera_movement[start - 1:start],
+                                                                            camera_movement]), axis=0)[1 if start > 0 else 0:]
+        self._length = stop
+
+        self.possession = self._possession[:stop]
+        self.ball_control = self._ball_control[:stop]
+        self.camera_movement = self._camera_movement[:stop]
+        self.total_camera_movement = self._total_camera_movement[:stop]
+
+    def set_object_counts(self, tracks):
+        if isinstance(tracks, TrackTable):
+            self.object_counts = {object_name: np.diff(tracks.offsets[TrackTable.object_index(object_name)])
+                                  for object_name in tracks}
+
+    def __len__(self):
+        return len(self.possession)
+
+    def at(self, frame_num):
+        """All overlay values of one frame"""
+        values = {"possession": int(self.possession[frame_num]),
+                  "team_1_ball_control": float(self.ball_control[frame_num, 0]),
+                  "team_2_ball_control": float(self.ball_control[frame_num, 1]),
+                  "camera_movement": tuple(self.camera_movement[frame_num].tolist()),
+                  "total_camera_movement": tuple(self.total_camera_movement[frame_num].tolist())}
+        if self.object_counts is not None:
+            for object_name, counts in self.object_counts.items():
+                values[f"num_{object_name}"] = int(counts[frame_num])
+        return values
+
+    def ball_control_text(self, frame_num):
+        team_1, team_2 = self.ball_control[frame_num].tolist()
+        return f"Team 1 Ball Control: {team_1*100:.2f}%", f"Team 2 Ball Control: {team_2*100:.2f}%"
+
+    def camera_movement_text(self, frame_num):
+        x_movement, y_movement = self.camera_movement[frame_num].tolist()
+        return f"Camera Movement X: {x_movement:.2f}", f"Camera Movement Y: {y_movement:.2f}"
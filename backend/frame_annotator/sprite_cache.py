@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+from collections import OrderedDict
+from .drawing import ellipse_marker, id_label, triangle_marker
+
+class SpriteCache:
+    """
+    Bounded cache of pre-rendered markers and labels.
+
+    Every sprite is rasterized once, onto a black and a white canvas. The
+    black render is the premultiplied sprite and the difference between
+    the two is how much of the background shows through, which gives the
+    alpha mask (binary for markers, antialiased for text). Drawing is then
+    a small alpha blend into the frame at the sprite's anchor point. Sprites are keyed by kind, color, ellipse
+    size (rounded to width_bucket pixels) and text, and the least recently
+    used ones are evicted beyond max_sprites, so long matches with many
+    distinct speed labels stay bounded.
+    """
+
+    def __init__(self, max_sprites=2048, width_bucket=2):
+        self.max_sprites = max_sprites
+        self.width_bucket = width_bucket
+        self.sprites = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _cached(self, key):
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.stats["hits"] += 1
+        return sprite
+
+    def _render(self, key, extent, draw):
+        # extent is (x1, y1, x2, y2) relative to the anchor, the anchor sits at (-x1, -y1) on the canvas
+        self.stats["misses"] += 1
+        x1, y1, x2, y2 = extent
+        on_black = np.zeros((y2 - y1, x2 - x1, 3), dtype=np.uint8)
+        on_white = np.full_like(on_black, 255)
+        draw(on_black, -x1, -y1)
+        draw(on_white, -x1, -y1)
+        # 255 where the background shows through completely, 0 where the sprite covers it
+        transparency = cv2.subtract(on_white, on_black).max(axis=2)
+        mask = (transparency == 0).astype(np.uint8)
+        if np.isin(transparency, (0, 255)).all():
+            # Hard edges, a masked copy is enough
+            sprite = (on_black, mask, None, x1, y1)
+        else:
+            sprite = (on_black, mask, cv2.merge([transparency] * 3), x1, y1)
+
+        self.sprites[key] = sprite
+        while len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+            self.stats["evictions"] += 1
+        return sprite
+
+    @staticmethod
+    def blit(frame, sprite, x, y):
+        """Blend sprite into frame with its anchor at (x, y), clipped to the frame"""
+        pixels, mask, transparency, offset_x, offset_y = sprite
+        height, width = frame.shape[:2]
+        left, top = x + offset_x, y + offset_y
+        x1, y1 = max(left, 0), max(top, 0)
+        x2, y2 = min(left + pixels.shape[1], width), min(top + pixels.shape[0], height)
+        if x1 >= x2 or y1 >= y2:
+            return frame
+        sprite_region = (slice(y1 - top, y2 - top), slice(x1 - left, x2 - left))
+        region = frame[y1:y2, x1:x2]
+        if transparency is None:
+            cv2.copyTo(pixels[sprite_region], mask[sprite_region], region)
+        else:
+            cv2.multiply(region, transparency[sprite_region], dst=region, scale=1 / 255)
+            cv2.add(region, pixels[sprite_region], dst=region)
+        return frame
+
+    def _bucket(self, size):
+        return int(self.width_bucket * round(size / self.width_bucket))
+
+    def ellipse(self, frame, x, y, axes, color):
+        axes = (self._bucket(axes[0]), self._bucket(axes[1]))
+        key = ("ellipse", color, axes)
+        sprite = self._cached(key)
+        if sprite is None:
+            # Room for the line thickness around the axes
+            sprite = self._render(key, (-axes[0] - 3, -axes[1] - 3, axes[0] + 4, axes[1] + 4),
+                                  lambda canvas, anchor_x, anchor_y: ellipse_marker(canvas, anchor_x, anchor_y, axes, color))
+        return self.blit(frame, sprite, x, y)
+
+    def id_label(self, frame, x, y, color, track_id):
+        key = ("id_label", color, track_id)
+        sprite = self._cached(key)
+        if sprite is None:
+            # The box spans x-20..x+20 and y+5..y+25, IDs of three or more digits stick out on the right
+            (text_width, _), _ = cv2.getTextSize(f"{track_id}", cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+            sprite = self._render(key, (-22, 0, max(22, text_width - 4), 30),
+                                  lambda canvas, anchor_x, anchor_y: id_label(canvas, anchor_x, anchor_y, color, track_id))
+        return self.blit(frame, sprite, x, y)
+
+    def triangle(self, frame, x, y, color):
+        key = ("triangle", color)
+        sprite = self._cached(key)
+        if sprite is None:
+            sprite = self._render(key, (-13, -23, 14, 3),
+                                  lambda canvas, anchor_x, anchor_y: triangle_marker(canvas, anchor_x, anchor_y, color))
+        return self.blit(frame, sprite, x, y)
+
+    def text(self, frame, text, x, y, font_scale=0.5, color=(0, 0, 0), thickness=2):
+        """cv2.putText of text with its baseline origin at (x, y)"""
+        key = ("text", text, font_scale, color, thickness)
+        sprite = self._cached(key)
+        if sprite is None:
+            (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            pad = thickness + 2
+            def draw(canvas, anchor_x, anchor_y):
+                cv2.putText(canvas, text, (anchor_x, anchor_y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+            sprite = self._render(key, (-pad, -text_height - pad, text_width + pad, baseline + pad), draw)
+        return self.blit(frame, sprite, x, y)
@@ -0,0 +1,2 @@
+from .pipeline import Pipeline, Stage
+from .video_analysis import VideoAnalysisPipeline
\ No newline at end of file
@@ -0,0 +1,192 @@
+import queue
+import threading
+import time
+
+_END = object()
+
+class Stage:
+    """A pipeline step that runs on its own worker thread"""
+
+    def __init__(self, name, process, finish=None):
+        """
+        Args:
+            name: Stage name used in stats and error messages
+            process: Callable taking one item and returning the item for the next
+                stage, or None to pass nothing on
+            finish: Optional callable run once after the last item, returning a
+                final item for the next stage (e.g. what a buffering stage still
+                holds), or None
+        """
+        self.name = name
+        self.process = process
+        self.finish = finish
+        self.items = 0
+        self.busy_time = 0.0
+        self.input_wait_time = 0.0
+        self.output_wait_time = 0.0
+        # Input queue depth sampled before every get, stalls count gets on an empty
+        # and puts on a full queue
+        self.input_depth_sum = 0
+        self.input_depth_samples = 0
+        self.input_max_depth = 0
+        self.input_stalls = 0
+        self.output_stalls = 0
+
+    def record_input_depth(self, depth):
+        self.input_depth_sum += depth
+        self.input_depth_samples += 1
+        self.input_max_depth = max(self.input_max_depth, depth)
+
+    def get_stats(self):
+        return {
+            "items": self.items,
+            "busy_time": self.busy_time,
+            "input_wait_time": self.input_wait_time,
+            "output_wait_time": self.output_wait_time,
+            "input_mean_depth": self.input_depth_sum / self.input_depth_samples if self.input_depth_samples else 0.0,
+            "input_max_depth": self.input_max_depth,
+            "input_stalls": self.input_stalls,
+            "output_stalls": self.output_stalls
+        }
+
+class Pipeline:
+    """
+    Runs a source and a chain of stages concurrently, connected by bounded queues.
+
+    While stage k works on item n, stage k-1 already works on item n+1, so the
+    wall time approaches that of the slowest stage instead of the sum of all
+    stages. The queue size bounds how far the stages can drift apart, and with
+    it the number of items in memory. Per-queue depth and stall counts show
+    which side of a queue is waiting: a stage whose input queue is mostly
+    empty is starved by the stage before it, a stage that stalls on a full
+    output queue is held back by the stage after it.
+    """
+
+    def __init__(self, stages, queue_size=2, source_name="source"):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.source_stage = Stage(source_name, None)
+        self.error = None
+        self.wall_time = 0.0
+        self._stop = threading.Event()
+
+    def run(self, source):
+        """Feed every item of the source iterable through all stages and block until done"""
+        self.error = None
+        self._stop.clear()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+
+        workers = [threading.Thread(target=self._run_source, args=(source, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            output_queue = queues[i + 1] if i + 1 < len(queues) else None
+            workers.append(threading.Thread(target=self._run_stage,
+                                            args=(stage, queues[i], output_queue),
+                                            daemon=True))
+
+        start_time = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.wall_time = time.perf_counter() - start_time
+
+        if self.error is not None:
+            raise self.error
+
+    def get_stats(self):
+        stats = {stage.name: stage.get_stats() for stage in [self.source_stage] + self.stages}
+        stats["bottleneck"] = max(stats, key=lambda name: stats[name]["busy_time"])
+        return stats
+
+    def _put(self, output_queue, item, stage):
+        try:
+            output_queue.put_nowait(item)
+            return True
+        except queue.Full:
+            stage.output_stalls += 1
+
+        wait_start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                stage.output_wait_time += time.perf_counter() - wait_start
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, input_queue, stage):
+        stage.record_input_depth(input_queue.qsize())
+        try:
+            return input_queue.get_nowait()
+        except queue.Empty:
+            stage.input_stalls += 1
+
+        wait_start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = input_queue.get(timeout=0.1)
+                stage.input_wait_time += time.perf_counter() - wait_start
+                return item
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, stage, error):
+        if self.error is None:
+            print(f"Pipeline stage '{stage.name}' failed: {error}")
+            self.error = error
+        self._stop.set()
+
+    def _run_source(self, source, output_queue):
+        stage = self.source_stage
+        iterator = iter(source)
+        try:
+            while True:
+                busy_start = time.perf_counter()
+                item = next(iterator, _END)
+                stage.busy_time += time.perf_counter() - busy_start
+                if item is _END:
+                    break
+                stage.items += 1
+                if not self._put(output_queue, item, stage):
+                    return
+        except Exception as e:
+            self._fail(stage, e)
+            return
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+        self._put(output_queue, _END, stage)
+
+    def _run_stage(self, stage, input_queue, output_queue):
+        while True:
+            item = self._get(input_queue, stage)
+            if item is _END:
+                break
+            try:
+                busy_start = time.perf_counter()
+                result = stage.process(item)
+                stage.busy_time += time.perf_counter() - busy_start
+                stage.items += 1
+            except Exception as e:
+                self._fail(stage, e)
+                return
+            if result is not None and output_queue is not None:
+                if not self._put(output_queue, result, stage):
+                    return
+        if self._stop.is_set():
+            return
+        if stage.finish is not None:
+            try:
+                busy_start = time.perf_counter()
+                result = stage.finish()
+                stage.busy_time += time.perf_counter() - busy_start
+            except Exception as e:
+                self._fail(stage, e)
+                return
+            if result is not None and output_queue is not None:
+                if not self._put(output_queue, result, stage):
+                    return
+        if output_queue is not None:
+            self._put(output_queue, _END, stage)
@@ -0,0 +1,265 @@
+import numpy as np
+from itertools import islice
+import sys
+sys.path.append('../')
+from backend.utils import VideoWriter, StubCache, get_video_info, iter_video_frames
+from backend.trackers import Tracker, ShardedDetector, PitchROI
+from backend.track_table import TrackTable, TrackTableBuilder, OBJECTS
+from backend.ball_tracker import BallSearch
+from backend.team_assigner import TeamAssigner
+from backend.camera_movement_estimator import CameraMovementEstimator, ParallelCameraMovement
+from backend.frame_annotator import FrameAnnotator
+from backend.track_enricher import TrackEnricher
+from .pipeline import Pipeline, Stage
+
+class VideoAnalysisPipeline:
+    """
+    Runs the full match analysis as a single pipelined pass over the video.
+
+    decode -> camera movement -> detect -> track -> team -> enrich -> annotate
+    -> encode, every stage on its own thread, connected by bounded queues of
+    frame chunks, so the video is decoded once and detection overlaps drawing
+    and encoding. Ball gaps, speed windows and possession smoothing only look
+    a bounded number of frames ahead, so the enrich stage (TrackEnricher)
+    holds that many frames back and passes each range on once it is final.
+    """
+
+    def __init__(self, model_path='backend/models/football-player-detection.pt',
+                 stub_dir='backend/stubs', max_stub_size_mb=2048, chunk_size=16, queue_size=2,
+                 backend='torch', int8=False, num_workers=1, max_ball_gap=25, keyframe_interval=1,
+                 pitch_roi=False, class_conf=None, classes=None, max_per_class=None, light_model_path=None,
+                 ball_search=False, annotation_layers=None, camera_estimator='max', camera_scale=1.0,
+                 camera_feature_tracks=False, camera_workers=1, camera_chunk_size=64):
+        self.model_path = model_path
+        # "median" or "ransac" keep a single outlier feature from defining the camera movement
+        self.camera_estimator = camera_estimator
+        # e.g. 0.5 on 1080p or 0.25 on 4K, camera movement is found on frames resized by this factor
+        self.camera_scale = camera_scale
+        self.camera_feature_tracks = camera_feature_tracks
+        self.camera_workers = camera_workers
+        # Frames per chunk estimated by one worker, results differ from a serial run at chunk boundaries
+        self.camera_chunk_size = camera_chunk_size
+        # Overlays drawn on the output video, None draws every layer of frame_annotator.LAYERS
+        self.annotation_layers = annotation_layers
+        self.ball_search = ball_search
+        self.light_model_path = light_model_path
+        # Per-class detection settings keyed by class name, see DetectionFilter
+        self.class_conf = class_conf
+        self.classes = classes
+        self.max_per_class = max_per_class
+        self.pitch_roi = pitch_roi
+        self.keyframe_interval = keyframe_interval
+        self.max_ball_gap = max_ball_gap
+        self.backend = backend
+        self.int8 = int8
+        self.num_workers = num_workers
+        self.stub_cache = StubCache(stub_dir, max_size_mb=max_stub_size_mb)
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.pipeline_stats = {}
+        # Per-frame overlay values of the last analyzed video, e.g. for the GUI
+        self.hud_timeline = None
+
+    def _iter_frame_chunks(self, video_path, chunk_size=None):
+        # chunk_size may be a callable, re-evaluated for every chunk
+        frames = iter_video_frames(video_path)
+        start_frame = 0
+        while True:
+            size = chunk_size() if callable(chunk_size) else chunk_size
+            chunk = list(islice(frames, size or self.chunk_size))
+            if not chunk:
+                break
+            yield start_frame, chunk
+            start_frame += len(chunk)
+
+    def _camera_parallel_params(self):
+        # The worker count does not change the result, only where the chunks start
+        if self.camera_workers <= 1:
+            return None
+        return {"chunk_size": self.camera_chunk_size, "overlap": 1}
+
+    def run(self, video_path, output_video_path):
+        """Analyze video_path, write the annotated video and return (tracks, team_ball_control)"""
+        first_frame = next(iter_video_frames(video_path), None)
+        if first_frame is None:
+            raise ValueError("Could not read any frames from the selected video")
+
+        # int8 exports are calibrated on the first video analyzed and reused afterwards
+        tracker = Tracker(self.model_path, self.backend, self.int8, calibration_video=video_path,
+                          keyframe_interval=self.keyframe_interval,
+                          pitch_roi=PitchROI() if self.pitch_roi else None,
+                          class_conf=self.class_conf, classes=self.classes, max_per_class=self.max_per_class,
+                          light_model_path=self.light_model_path)
+        if self.num_workers > 1:
+            # Before the cache lookup, so the options fail the same way with or without cached tracks
+            tracker.check_sharded_detection()
+        camera_movement_estimator = CameraMovementEstimator(first_frame, self.camera_estimator, self.camera_scale,
+                                                            persistent_features=self.camera_feature_tracks)
+        team_assigner = TeamAssigner()
+        # Look for the ball at full resolution around its predicted position where it was missed
+        ball_search = BallSearch(tracker.detect_ball, max_gap=self.max_ball_gap) if self.ball_search else None
+
+        # Stubs are keyed by video content, model weights and parameters rather than the file name
+        track_key = self.stub_cache.make_key("tracks",
+                                             files=[video_path, self.model_path],
+                                             params={**tracker.get_cache_params(),
+                                                     "ball_search": ball_search.get_cache_params() if ball_search else None})
+        camera_movement_key = self.stub_cache.make_key("camera_movement",
+                                                       files=[video_path],
+                                                       params={**camera_movement_estimator.get_cache_params(),
+                                                               "parallel": self._camera_parallel_params()})
+
+        # Copy-on-write mapping: team assignment writes stay in memory and never touch the cache entry
+        track_columns = self.stub_cache.load(track_key, mmap_mode='c')
+        tracks = TrackTable.from_columns(track_columns) if track_columns is not None else None
+        camera_movement_per_frame = self.stub_cache.load(camera_movement_key)
+        if camera_movement_per_frame is not None:
+            camera_movement_per_frame = camera_movement_per_frame["camera_movement"].astype(np.float64)
+
+        video_info = get_video_info(video_path)
+        track_enricher = TrackEnricher(max_gap=self.max_ball_gap)
+        self.hud_timeline = track_enricher.hud_timeline
+        frame_annotator = FrameAnnotator(self.annotation_layers)
+
+        # One pass: decode -> camera movement -> detect -> track -> team -> enrich -> annotate -> encode
+        stages = []
+        parallel_camera_movement = None
+        if camera_movement_per_frame is None:
+            camera_movement_per_frame = []
+            if self.camera_workers > 1:
+                # The stage only hands grayscale frames to the pool, chunks are estimated in worker processes
+                parallel_camera_movement = ParallelCameraMovement(camera_movement_estimator, self.camera_workers,
+                                                                  **self._camera_parallel_params())
+                def estimate_camera_movement(item):
+                    parallel_camera_movement.submit(item[1])
+                    return item
+            else:
+                def estimate_camera_movement(item):
+                    _, frames = item
+                    camera_movement_estimator.update_camera_movement(camera_movement_per_frame, frames)
+                    return item
+            stages.append(Stage("camera_movement", estimate_camera_movement))
+            save_camera_movement = True
+        else:
+            save_camera_movement = False
+
+        sharded_detector = None
+        queue_size = self.queue_size
+        if tracks is None:
+            tracks = TrackTableBuilder()
+            if self.num_workers > 1:
+                # detect only hands the chunk to a worker process, track waits for it in frame order
+                sharded_detector = ShardedDetector(tracker.inference_model_path, self.num_workers,
+                                                   tracker.detection_filter.predict_conf,
+                                                   classes=tracker.detection_filter.predict_classes)
+                def detect(item):
+                    start_frame, frames = item
+                    return start_frame, frames, sharded_detector.submit(frames)
+                def track(item):
+                    start_frame, frames, handle = item
+                    return start_frame, frames, tracker.add_detections_to_tracks(tracks, sharded_detector.result(handle))
+                # Enough chunks in flight to keep every worker busy
+                queue_size = max(self.queue_size, self.num_workers)
+                chunk_size = self.chunk_size
+            else:
+                def detect(item):
+                    start_frame, frames = item
+                    return start_frame, frames, tracker.detect_frames(frames)
+                def track(item):
+                    start_frame, frames, detections = item
+                    return start_frame, frames, tracker.add_detections_to_tracks(tracks, detections)
+                # Chunks follow the adaptive detection batch size so whole batches reach the model
+                chunk_size = lambda: tracker.batch_sizer.batch_size
+            stages.append(Stage("detect", detect))
+            stages.append(Stage("track", track))
+            if ball_search is not None:
+                def search_ball(item):
+                    start_frame, frames, rows = item
+                    # The found balls travel with the chunk as an extra rows array
+                    return item + (tracks.append(ball_search.search(frames, rows, start_frame), 0),)
+                stages.append(Stage("ball_search", search_ball))
+            save_tracks = True
+        else:
+            save_tracks = False
+            chunk_size = None
+
+        def chunk_rows(item):
+            # Freshly tracked chunks carry their own rows, cached tracks are sliced out of the table
+            start_frame, frames = item[:2]
+            if save_tracks:
+                return item[2:]
+            return tuple(tracks.rows(object_name, start_frame, start_frame + len(frames)) for object_name in OBJECTS)
+
+        def assign_teams(item):
+            start_frame, frames = item[:2]
+            rows = item[2] if save_tracks else tracks.rows('players', start_frame, start_frame + len(frames))
+            players = np.flatnonzero(rows['object'] == TrackTable.object_index('players'))
+            frame_nums, player_ids, bboxes = (rows[field][players].tolist() for field in ('frame', 'track_id', 'bbox'))
+            if start_frame == 0:
+                team_assigner.assign_team_color(frames[0], {player_id: {'bbox': bbox}
+                                                            for frame_num, player_id, bbox in zip(frame_nums, player_ids, bboxes)
+                                                            if frame_num == 0})
+            teams = [team_assigner.get_player_team(frames[frame_num - start_frame], bbox, player_id)
+                     for frame_num, player_id, bbox in zip(frame_nums, player_ids, bboxes)]
+            rows['team'][players] = teams
+            rows['team_color'][players] = np.array([team_assigner.team_colors[team] for team in teams],
+                                                   dtype=np.uint8).reshape(-1, 3)
+            return item
+        stages.append(Stage("team_assignment", assign_teams))
+
+        def enrich(item):
+            start_frame, frames = item[:2]
+            stop_frame = start_frame + len(frames)
+            if parallel_camera_movement is not None:
+                camera_movement = parallel_camera_movement.collect(stop_frame)
+            else:
+                camera_movement = camera_movement_per_frame[start_frame:stop_frame]
+            return track_enricher.add(start_frame, frames, np.concatenate(chunk_rows(item)), camera_movement)
+        def finish_enrichment():
+            # The last frames of the video have no lookahead, they are final now
+            return track_enricher.finish(parallel_camera_movement.collect() if parallel_camera_movement is not None else ())
+        stages.append(Stage("enrich", enrich, finish_enrichment))
+
+        def annotate(item):
+            start_frame, frames, frame_tracks = item
+            # Every earlier stage is done with these frames, so every layer is drawn straight into them
+            return frame_annotator.draw(frames, frame_tracks, self.hud_timeline, start_frame)
+        stages.append(Stage("annotate", annotate))
+
+        with VideoWriter(output_video_path,
+                         fps=video_info["fps"],
+                         frame_size=(video_info["width"], video_info["height"]),
+                         queue_size=self.queue_size * self.chunk_size) as video_writer:
+            stages.append(Stage("encode", video_writer.write_frames))
+            if callable(chunk_size):
+                # Every stage holds one chunk and queues up to queue_size more, all of batch_size frames. The
+                # enricher holds its lookahead (plus a camera chunk still being gathered) and the writer its queue
+                held_frames = track_enricher.lookahead + self.queue_size * self.chunk_size
+                if parallel_camera_movement is not None:
+                    held_frames += self.camera_chunk_size
+                tracker.batch_sizer.set_frames_in_flight(len(stages) * (queue_size + 1), first_frame.nbytes, held_frames)
+            pipeline = Pipeline(stages, queue_size, source_name="decode")
+            try:
+                pipeline.run(self._iter_frame_chunks(video_path, chunk_size))
+                if parallel_camera_movement is not None:
+                    camera_movement_per_frame = parallel_camera_movement.result()
+            finally:
+                if sharded_detector is not None:
+                    sharded_detector.close()
+                if parallel_camera_movement is not None:
+                    parallel_camera_movement.close()
+        self.pipeline_stats["analysis"] = pipeline.get_stats()
+        print(f"Analysis pass: {pipeline.wall_time:.1f}s, bottleneck: {self.pipeline_stats['analysis']['bottleneck']}")
+        if tracker.cascade is not None:
+            print(f"Detector cascade: {dict(tracker.cascade.stats['tiers'])}, escalations: {dict(tracker.cascade.stats['reasons'])}")
+
+        if save_tracks:
+            self.stub_cache.save(track_key, tracks.build().to_columns())
+        if save_camera_movement:
+            camera_movement_per_frame = np.asarray(camera_movement_per_frame, dtype=np.float64).reshape(-1, 2)
+            self.stub_cache.save(camera_movement_key,
+                                 {"camera_movement": camera_movement_per_frame})
+
+        tracks = track_enricher.build()
+        self.hud_timeline.set_object_counts(tracks)
+        return tracks, np.array(track_enricher.team_ball_control)
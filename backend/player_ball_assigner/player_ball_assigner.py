@@ -1,3 +1,4 @@
+import numpy as np
 import sys 
 sys.path.append('../')
 from backend.utils import get_center_of_bbox, measure_distance
@@ -5,6 +6,7 @@ from backend.utils import get_center_of_bbox, measure_distance
 class PlayerBallAssigner():
     def __init__(self):
         self.max_player_ball_distance = 70
+        self.reset()
     
     def assign_ball_to_player(self,players,ball_bbox):
         ball_position = get_center_of_bbox(ball_bbox)
@@ -24,4 +26,75 @@ class PlayerBallAssigner():
                     miniumum_distance = distance
                     assigned_player = player_id
 
-        return assigned_player
\ No newline at end of file
+        return assigned_player
+
+    def reset(self):
+        self.current_possession = None
+        self.possession_buffer = []
+        self.frames_seen = 0
+
+    def assign_team_ball_control(self,tracks,buffer_size=3):
+        self.reset()
+        frame_tracks = []
+        for frame_num in range(len(tracks['players'])):
+            ball_track = tracks['ball'][frame_num]
+            frame_tracks.append((tracks['players'][frame_num], ball_track[1]['bbox'] if 1 in ball_track else None))
+        team_ball_control, assigned_players = self.update_team_ball_control(frame_tracks, buffer_size)
+        for frame_num, assigned_player in enumerate(assigned_players):
+            if assigned_player != -1:
+                tracks['players'][frame_num][assigned_player]['has_ball'] = True
+        # Convert to numpy array for more efficient processing
+        return np.array(team_ball_control)
+
+    def update_team_ball_control(self,frame_tracks,buffer_size=3):
+        """
+        Continue the ball control over the next frames, so a video can be processed range by range.
+
+        frame_tracks holds a (players, ball_bbox) pair per frame, players maps
+        player_id to a dict with 'bbox' and 'team', ball_bbox is None without a
+        ball. The first call after reset() must hold the first 10 frames, or
+        every frame of a shorter video. Returns the team in control and the
+        player_id with the ball (-1 for none) of every frame.
+        """
+        team_ball_control = []
+        assigned_players = []
+        first_frame = 0
+        if self.frames_seen == 0:
+            # Find the first frame where the player has the ball and initialize the initial state
+            initial_frame = 0
+            # Find the initial ball control state in the first 10 frames
+            for frame_num, (players, ball_bbox) in enumerate(frame_tracks[:10]):
+                if ball_bbox is None:
+                    continue
+                assigned_player = self.assign_ball_to_player(players, ball_bbox)
+                if assigned_player != -1:
+                    self.current_possession = players[assigned_player]['team']
+                    initial_frame = frame_num
+                    break
+            # Fill frames from start to found frame
+            team_ball_control.extend([self.current_possession] * (initial_frame + 1))
+            assigned_players.extend([-1] * (initial_frame + 1))
+            first_frame = initial_frame + 1
+
+        # Process remaining frames with small buffers to avoid sudden changes
+        for players, ball_bbox in frame_tracks[first_frame:]:
+            # Frames where the ball was lost for too long to be filled have no ball
+            assigned_player = -1
+            if ball_bbox is not None:
+                assigned_player = self.assign_ball_to_player(players, ball_bbox)
+            if assigned_player != -1:
+                new_possession = players[assigned_player]['team']
+                self.possession_buffer.append(new_possession)
+            else:
+                self.possession_buffer.append(self.current_possession)
+            # Only update possession when buffer is large enough and consistent
+            if len(self.possession_buffer) >= buffer_size:
+                most_common = max(set(self.possession_buffer), key=self.possession_buffer.count)
+                if self.possession_buffer.count(most_common) >= buffer_size - 1:
+                    self.current_possession = most_common
+                self.possession_buffer.pop(0)
+            team_ball_control.append(self.current_possession)
+            assigned_players.append(assigned_player)
+
+        self.frames_seen += len(frame_tracks)
+        return team_ball_control, assigned_players
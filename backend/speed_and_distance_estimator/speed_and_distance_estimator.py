@@ -1,7 +1,9 @@
 import cv2
+import numpy as np
 import sys 
 sys.path.append('../')
 from backend.utils import measure_distance ,get_foot_position
+from backend.track_table import TrackTable
 
 class SpeedAndDistance_Estimator():
     def __init__(self):
@@ -9,6 +11,13 @@ class SpeedAndDistance_Estimator():
         self.frame_rate=24
     
     def add_speed_and_distance_to_tracks(self,tracks):
+        if isinstance(tracks, TrackTable):
+            for object in tracks:
+                if object == "ball" or object == "referees":
+                    continue
+                self.add_speed_and_distance_to_rows(tracks.rows(object), tracks.num_frames)
+            return
+
         total_distance= {}
 
         for object, object_tracks in tracks.items():
@@ -17,6 +26,8 @@ class SpeedAndDistance_Estimator():
             number_of_frames = len(object_tracks)
             for frame_num in range(0,number_of_frames, self.frame_window):
                 last_frame = min(frame_num+self.frame_window,number_of_frames-1 )
+                if last_frame == frame_num:
+                    continue
 
                 for track_id,_ in object_tracks[frame_num].items():
                     if track_id not in object_tracks[last_frame]:
@@ -47,9 +58,73 @@ class SpeedAndDistance_Estimator():
                         tracks[object][frame_num_batch][track_id]['speed'] = speed_km_per_hour
                         tracks[object][frame_num_batch][track_id]['distance'] = total_distance[object][track_id]
     
-    def draw_speed_and_distance(self,frames,tracks):
+    def add_speed_and_distance_to_rows(self,rows,number_of_frames,start_frame=0,stop_frame=None,distance_so_far=None):
+        # Vectorized version of the window loop above for one object's TrackTable rows
+        # Only windows starting in [start_frame, stop_frame) are filled in, and distance_so_far
+        # ({track_id: distance}) carries the running totals from one call to the next
+        if len(rows) == 0:
+            return
+        frames = rows['frame'].astype(np.int64)
+        track_ids = rows['track_id'].astype(np.int64)
+        positions = rows['position_transformed'].astype(np.float64)
+
+        # Look up rows by (track_id, frame)
+        keys = track_ids*(number_of_frames+1) + frames
+        key_order = np.argsort(keys)
+        sorted_keys = keys[key_order]
+
+        # Windows start on every frame_window-th frame and end on the first frame of the next one
+        is_start = (frames % self.frame_window == 0) & (frames >= start_frame)
+        if stop_frame is not None:
+            is_start &= frames < stop_frame
+        starts = np.flatnonzero(is_start)
+        start_frames = frames[starts]
+        last_frames = np.minimum(start_frames+self.frame_window, number_of_frames-1)
+        end_keys = track_ids[starts]*(number_of_frames+1) + last_frames
+        end_pos = np.minimum(np.searchsorted(sorted_keys, end_keys), len(sorted_keys)-1)
+        found = sorted_keys[end_pos] == end_keys
+        ends = key_order[end_pos]
+
+        valid = found & (last_frames > start_frames)
+        valid &= ~np.isnan(positions[starts]).any(axis=1) & ~np.isnan(positions[ends]).any(axis=1)
+        starts, ends, start_frames, last_frames = starts[valid], ends[valid], start_frames[valid], last_frames[valid]
+
+        distance_covered = np.linalg.norm(positions[ends]-positions[starts], axis=1)
+        time_elapsed = (last_frames-start_frames)/self.frame_rate
+        speed_km_per_hour = distance_covered/time_elapsed*3.6
+
+        # Running total distance per track, in window order
+        window_track_ids = track_ids[starts]
+        window_order = np.lexsort((start_frames, window_track_ids))
+        cumulative = np.cumsum(distance_covered[window_order])
+        group_start = np.r_[True, window_track_ids[window_order][1:] != window_track_ids[window_order][:-1]]
+        group_offset = np.maximum.accumulate(np.where(group_start, np.arange(len(cumulative)), 0))
+        total_distance = np.empty_like(cumulative)
+        total_distance[window_order] = cumulative - np.r_[0, cumulative][group_offset]
+        if distance_so_far is not None and len(total_distance):
+            total_distance += np.array([distance_so_far.get(track_id, 0.0) for track_id in window_track_ids.tolist()])
+            group_end = np.r_[group_start[1:], True]
+            distance_so_far.update(zip(window_track_ids[window_order][group_end].tolist(),
+                                       total_distance[window_order][group_end].tolist()))
+
+        # Every row inside [window start, window end) of a valid window gets that window's values
+        window_keys = window_track_ids*(number_of_frames+1) + start_frames
+        window_key_order = np.argsort(window_keys)
+        sorted_window_keys = window_keys[window_key_order]
+        row_window_keys = track_ids*(number_of_frames+1) + (frames - frames % self.frame_window)
+        if len(sorted_window_keys) == 0:
+            return
+        window_pos = np.minimum(np.searchsorted(sorted_window_keys, row_window_keys), len(sorted_window_keys)-1)
+        in_window = sorted_window_keys[window_pos] == row_window_keys
+        windows = window_key_order[window_pos]
+        in_window &= frames < last_frames[windows]
+
+        rows['speed'][in_window] = speed_km_per_hour[windows[in_window]]
+        rows['distance'][in_window] = total_distance[windows[in_window]]
+
+    def draw_speed_and_distance(self,frames,tracks,start_frame=0):
         output_frames = []
-        for frame_num, frame in enumerate(frames):
+        for frame_num, frame in enumerate(frames, start_frame):
             for object, object_tracks in tracks.items():
                 if object == "ball" or object == "referees":
                     continue 
@@ -0,0 +1 @@
+from .track_enricher import TrackEnricher
\ No newline at end of file
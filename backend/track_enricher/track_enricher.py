@@ -0,0 +1,158 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from backend.track_table import TrackTable, TrackTableBuilder, COMPUTED_FIELDS, make_rows, empty_rows, add_position_to_rows
+from backend.ball_tracker import fill_gaps
+from backend.camera_movement_estimator import CameraMovementEstimator
+from backend.view_transformer import ViewTransformer
+from backend.speed_and_distance_estimator import SpeedAndDistance_Estimator
+from backend.player_ball_assigner import PlayerBallAssigner
+from backend.frame_annotator import HudTimeline
+
+# PlayerBallAssigner looks for the initial ball control in this many frames
+INITIAL_BALL_CONTROL_FRAMES = 10
+
+class TrackEnricher:
+    """
+    Enriches tracked chunks as soon as enough frames after them are known.
+
+    Positions, camera-adjusted and pitch positions only depend on their own
+    frame and its camera movement. A ball gap is filled once max_gap frames
+    after its start are known, speed needs the frame_window frames after a
+    window start and possession smoothing is causal, so a frame is final
+    lookahead frames after it. add() buffers the tracked chunks and returns
+    the frames that became final, with a TrackTable of their enriched rows,
+    finish() returns the rest at the end of the video. Gap filling, running
+    distances, possession and the HudTimeline carry their state from one
+    range to the next, so the result equals enriching the whole table at
+    once, with at most lookahead frames (plus the ones still waiting for
+    camera movement) held in memory.
+    """
+
+    def __init__(self, max_gap=25, view_transformer=None, speed_and_distance_estimator=None, player_assigner=None):
+        self.max_gap = max_gap
+        self.view_transformer = view_transformer or ViewTransformer()
+        self.speed_and_distance_estimator = speed_and_distance_estimator or SpeedAndDistance_Estimator()
+        self.player_assigner = player_assigner or PlayerBallAssigner()
+        self.player_assigner.reset()
+        self.lookahead = max(max_gap, self.speed_and_distance_estimator.frame_window)
+        self.hud_timeline = HudTimeline()
+        self.team_ball_control = []
+
+        # Frames and non-ball rows (sorted by frame) of [done, received), camera movement of [done, done + len)
+        self.frames = []
+        self.rows = empty_rows(0)
+        self.camera_movement = np.zeros((0, 2))
+        # Detected ball boxes of [ball_start, received), NaN without a ball
+        self.ball_bboxes = np.zeros((0, 4))
+        self.ball_start = 0
+        self.received = 0
+        self.positioned = 0
+        self.done = 0
+        self.distance_so_far = {}
+        self.enriched = TrackTableBuilder()
+
+    def add(self, start_frame, frames, rows, camera_movement=()):
+        """
+        Add the next tracked chunk, rows holds all its TrackTable rows and camera_movement
+        the movement of the frames that became known since the last call.
+        Returns (start_frame, frames, TrackTable) of the frames that became final, or None.
+        """
+        if start_frame != self.received:
+            raise ValueError(f"Expected the chunk starting at frame {self.received}, got {start_frame}")
+        ball = TrackTable.object_index("ball")
+        is_ball = rows["object"] == ball
+        ball_bboxes = np.full((len(frames), 4), np.nan)
+        ball_bboxes[rows["frame"][is_ball] - start_frame] = rows["bbox"][is_ball]
+        self.ball_bboxes = np.concatenate([self.ball_bboxes, ball_bboxes])
+
+        other_rows = rows[~is_ball]
+        other_rows = other_rows[np.argsort(other_rows["frame"], kind="stable")]
+        self.rows = np.concatenate([self.rows, other_rows])
+        self.frames.extend(frames)
+        self.received += len(frames)
+        self._add_camera_movement(camera_movement)
+        return self._enrich(final=False)
+
+    def finish(self, camera_movement=()):
+        """Enrich every remaining frame once the video ended, returns (start_frame, frames, TrackTable) or None"""
+        self._add_camera_movement(camera_movement)
+        if self.done + len(self.camera_movement) < self.received:
+            raise ValueError(f"Camera movement is missing for frames {self.done + len(self.camera_movement)} to {self.received}")
+        return self._enrich(final=True)
+
+    def build(self):
+        """The enriched TrackTable of every frame returned so far"""
+        return self.enriched.build(COMPUTED_FIELDS)
+
+    def _add_camera_movement(self, camera_movement):
+        camera_movement = np.asarray(camera_movement, dtype=np.float64).reshape(-1, 2)
+        self.camera_movement = np.concatenate([self.camera_movement, camera_movement])
+
+    def _add_positions(self, rows):
+        add_position_to_rows(rows)
+        CameraMovementEstimator.add_adjust_positions_to_rows(rows, self.camera_movement, self.done)
+        self.view_transformer.add_transformed_position_to_rows(rows)
+
+    def _enrich(self, final):
+        # Positions of every row whose camera movement is known, speed windows need them ahead of the final frames
+        positioned = min(self.received, self.done + len(self.camera_movement))
+        frames = self.rows["frame"]
+        if positioned > self.positioned:
+            self._add_positions(self.rows[np.searchsorted(frames, self.positioned):np.searchsorted(frames, positioned)])
+            self.positioned = positioned
+
+        start = self.done
+        stop = self.received if final else positioned - self.lookahead
+        if not final and start == 0 and stop < INITIAL_BALL_CONTROL_FRAMES:
+            return None
+        if stop <= start:
+            return None
+
+        # Fill ball gaps from max_gap + 1 frames back, a gap reaching further back is too long anyway
+        window_start = max(start - self.max_gap - 1, self.ball_start)
+        bboxes, estimated = fill_gaps(self.ball_bboxes[window_start - self.ball_start:], self.max_gap)
+        bboxes, estimated = bboxes[start - window_start:stop - window_start], estimated[start - window_start:stop - window_start]
+        has_ball = ~np.isnan(bboxes).any(axis=1)
+        ball_frames = np.flatnonzero(has_ball)
+        ball_rows = make_rows(TrackTable.object_index("ball"), ball_frames + start, 1, bboxes[ball_frames])
+        ball_rows["estimated"] = estimated[ball_frames]
+        self._add_positions(ball_rows)
+
+        # Speed windows starting in [start, stop), they end at most frame_window frames later
+        window_rows = self.rows[np.searchsorted(frames, start):
+                                np.searchsorted(frames, stop + self.speed_and_distance_estimator.frame_window)]
+        is_player = window_rows["object"] == TrackTable.object_index("players")
+        players = window_rows[is_player]
+        self.speed_and_distance_estimator.add_speed_and_distance_to_rows(players, self.received, start, stop,
+                                                                         self.distance_so_far)
+        window_rows["speed"][is_player] = players["speed"]
+        window_rows["distance"][is_player] = players["distance"]
+
+        # Ball control goes frame by frame through the final frames
+        range_rows = self.rows[np.searchsorted(frames, start):np.searchsorted(frames, stop)]
+        frame_players = [{} for _ in range(stop - start)]
+        player_rows = [{} for _ in range(stop - start)]
+        for i in np.flatnonzero(range_rows["object"] == TrackTable.object_index("players")).tolist():
+            frame_num, track_id = int(range_rows["frame"][i]) - start, int(range_rows["track_id"][i])
+            frame_players[frame_num][track_id] = {"bbox": range_rows["bbox"][i].tolist(), "team": int(range_rows["team"][i])}
+            player_rows[frame_num][track_id] = i
+        team_ball_control, assigned_players = self.player_assigner.update_team_ball_control(
+            list(zip(frame_players, [bbox.tolist() if found else None for bbox, found in zip(bboxes, has_ball)])))
+        for frame_num, assigned_player in enumerate(assigned_players):
+            if assigned_player != -1:
+                range_rows["has_ball"][player_rows[frame_num][assigned_player]] = True
+        self.team_ball_control.extend(team_ball_control)
+        self.hud_timeline.extend(team_ball_control, self.camera_movement[:stop - start])
+
+        table = TrackTable(np.concatenate([range_rows, ball_rows]), stop - start, COMPUTED_FIELDS, start_frame=start)
+        self.enriched.append(table.data, stop - start)
+        final_frames = self.frames[:stop - start]
+        del self.frames[:stop - start]
+        self.rows = self.rows[np.searchsorted(frames, stop):]
+        self.camera_movement = self.camera_movement[stop - start:]
+        new_ball_start = max(stop - self.max_gap - 1, self.ball_start)
+        self.ball_bboxes = self.ball_bboxes[new_ball_start - self.ball_start:]
+        self.ball_start = new_ball_start
+        self.done = stop
+        return start, final_frames, table
@@ -0,0 +1,2 @@
+from .track_table import TrackTable, TrackTableBuilder, OBJECTS, TRACK_DTYPE, COMPUTED_FIELDS, make_rows, empty_rows
+from .positions import add_position_to_tracks, add_position_to_rows
\ No newline at end of file
@@ -0,0 +1,30 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from backend.utils import get_center_of_bbox, get_foot_position
+from .track_table import TrackTable
+
+def add_position_to_rows(rows):
+    """Same integer center/foot positions as add_position_to_tracks, for TrackTable rows at once"""
+    bbox = rows['bbox'].astype(np.float64)
+    is_ball = rows['object'] == TrackTable.object_index('ball')
+    x = np.trunc((bbox[:,0]+bbox[:,2])/2)
+    y = np.where(is_ball, np.trunc((bbox[:,1]+bbox[:,3])/2), np.trunc(bbox[:,3]))
+    rows['position'] = np.stack([x,y], axis=1).reshape(-1,2)
+
+def add_position_to_tracks(tracks):
+    """Ball center and player/referee foot position of every bbox, for a TrackTable or the nested dict tracks"""
+    if isinstance(tracks, TrackTable):
+        add_position_to_rows(tracks.data)
+        tracks.computed.add('position')
+        return
+
+    for object, object_tracks in tracks.items():
+        for frame_num, track in enumerate(object_tracks):
+            for track_id, track_info in track.items():
+                bbox = track_info['bbox']
+                if object == 'ball':
+                    position= get_center_of_bbox(bbox)
+                else:
+                    position = get_foot_position(bbox)
+                tracks[object][frame_num][track_id]['position'] = position
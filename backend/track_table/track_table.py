@@ -0,0 +1,282 @@
+from collections.abc import Mapping, MutableMapping, Sequence
+import numpy as np
+
+OBJECTS = ("players", "referees", "ball")
+
+# bbox and position_adjusted are float64 like the dict path, integer positions and the
+# pitch test truncate them and float32 rounding can move them across an integer
+TRACK_DTYPE = np.dtype([
+    ("object", np.int8),
+    ("frame", np.int32),
+    ("track_id", np.int32),
+    ("bbox", np.float64, 4),
+    ("position", np.float32, 2),
+    ("position_adjusted", np.float64, 2),
+    ("position_transformed", np.float32, 2),
+    ("speed", np.float32),
+    ("distance", np.float32),
+    ("team", np.int8),
+    ("team_color", np.uint8, 3),
+    ("has_ball", np.bool_),
+    ("estimated", np.bool_)
+])
+
+# Fields that every row has once the stage computing them ran (None when the value is NaN)
+COMPUTED_FIELDS = ("position", "position_adjusted", "position_transformed")
+# Fields that only some rows have (absent when NaN/0/False)
+OPTIONAL_FIELDS = ("speed", "distance", "team", "team_color", "has_ball", "estimated")
+FLOAT_FIELDS = ("bbox", "position", "position_adjusted", "position_transformed", "speed", "distance")
+
+def empty_rows(num_rows):
+    rows = np.zeros(num_rows, dtype=TRACK_DTYPE)
+    for field in FLOAT_FIELDS:
+        rows[field] = np.nan
+    return rows
+
+def make_rows(object_ids, frames, track_ids, bboxes):
+    rows = empty_rows(len(frames))
+    rows["object"] = object_ids
+    rows["frame"] = frames
+    rows["track_id"] = track_ids
+    rows["bbox"] = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    return rows
+
+class TrackTable(Mapping):
+    """
+    Columnar store for all tracks of a video.
+
+    One structured array holds a row per (object, frame, track_id), sorted in
+    that order, with bbox/position/speed/team columns, so enrichment stages can
+    update every detection with a single vectorized pass. The table is also a
+    read/write view with the old nested dict API:
+    tracks["players"][frame_num][track_id]["bbox"] works as before.
+    A table can also hold only the frames [start_frame, start_frame + num_frames)
+    of a video, rows() then takes video frame numbers while the dict view
+    counts from the table's first frame.
+    """
+
+    def __init__(self, data, num_frames, computed=(), start_frame=0):
+        order = np.lexsort((data["track_id"], data["frame"], data["object"]))
+        if not np.array_equal(order, np.arange(len(data))):
+            data = data[order]
+        self.data = data
+        self.num_frames = int(num_frames)
+        self.start_frame = int(start_frame)
+        self.computed = set(computed)
+        self._update_offsets()
+
+    def _update_offsets(self):
+        # offsets[object, frame] is the first row of that frame, offsets[object, num_frames] the end
+        keys = self.data["object"].astype(np.int64) * (self.num_frames + 1) + self.data["frame"] - self.start_frame
+        bounds = np.arange(len(OBJECTS))[:, None] * (self.num_frames + 1) + np.arange(self.num_frames + 1)[None, :]
+        self.offsets = np.searchsorted(keys, bounds)
+
+    @staticmethod
+    def object_index(object_name):
+        return OBJECTS.index(object_name)
+
+    def rows(self, object_name, start_frame=None, stop_frame=None):
+        """Writable view of the rows of one object, optionally limited to frames [start_frame, stop_frame)"""
+        object_index = self.object_index(object_name)
+        start = 0 if start_frame is None else max(start_frame - self.start_frame, 0)
+        stop = self.num_frames if stop_frame is None else min(stop_frame - self.start_frame, self.num_frames)
+        return self.data[self.offsets[object_index, start]:self.offsets[object_index, max(stop, start)]]
+
+    def __getitem__(self, object_name):
+        if object_name not in OBJECTS:
+            raise KeyError(object_name)
+        return ObjectTracksView(self, self.object_index(object_name))
+
+    def __setitem__(self, object_name, object_tracks):
+        replacement = TrackTable.from_dict({object_name: object_tracks}, num_frames=self.num_frames)
+        self.replace_rows(object_name, replacement.data)
+
+    def replace_rows(self, object_name, rows):
+        """Replace all rows of one object, e.g. with gap-filled ball positions"""
+        object_index = self.object_index(object_name)
+        keep = self.data["object"] != object_index
+        self.data = np.concatenate([self.data[keep], rows])
+        self.data = self.data[np.lexsort((self.data["track_id"], self.data["frame"], self.data["object"]))]
+        self._update_offsets()
+
+    def __iter__(self):
+        return iter(OBJECTS)
+
+    def __len__(self):
+        return len(OBJECTS)
+
+    @classmethod
+    def from_arrays(cls, num_frames, object_ids, frames, track_ids, bboxes):
+        return cls(make_rows(object_ids, frames, track_ids, bboxes), num_frames)
+
+    @classmethod
+    def from_dict(cls, tracks, num_frames=None):
+        """Build a table from the nested {object: [ {track_id: info} per frame ]} dict"""
+        if num_frames is None:
+            num_frames = max((len(object_tracks) for object_tracks in tracks.values()), default=0)
+
+        entries = [
+            (cls.object_index(object_name), frame_num, track_id, track_info)
+            for object_name, object_tracks in tracks.items()
+            for frame_num, track in enumerate(object_tracks)
+            for track_id, track_info in track.items()
+        ]
+        data = empty_rows(len(entries))
+        computed = set()
+        for i, (object_index, frame_num, track_id, track_info) in enumerate(entries):
+            row = data[i]
+            row["object"] = object_index
+            row["frame"] = frame_num
+            row["track_id"] = track_id
+            for field, value in track_info.items():
+                if field not in TRACK_DTYPE.names:
+                    continue
+                if field in COMPUTED_FIELDS:
+                    computed.add(field)
+                if value is not None:
+                    row[field] = value
+
+        return cls(data, num_frames, computed)
+
+    def to_dict(self):
+        return {
+            object_name: [{track_id: dict(row) for track_id, row in frame.items()}
+                          for frame in self[object_name]]
+            for object_name in OBJECTS
+        }
+
+    def to_columns(self):
+        return {
+            "rows": self.data,
+            "num_frames": np.array(self.num_frames, dtype=np.int64),
+            "computed": np.array(sorted(self.computed), dtype=np.str_)
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(columns["rows"], int(columns["num_frames"]), columns["computed"].tolist())
+
+class TrackTableBuilder:
+    """
+    Collects the rows of each tracked chunk while tracking runs.
+
+    Every chunk keeps its own array, so later stages can still write into
+    the rows of a chunk (e.g. team assignment) while new chunks are added.
+    build() concatenates and sorts them once.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.num_frames = 0
+
+    def append(self, rows, num_frames):
+        self.chunks.append(rows)
+        self.num_frames += num_frames
+        return rows
+
+    def build(self, computed=()):
+        data = np.concatenate(self.chunks) if self.chunks else empty_rows(0)
+        return TrackTable(data, self.num_frames, computed)
+
+class ObjectTracksView(Sequence):
+    """List-of-frames view of one object, as in tracks["players"]"""
+
+    def __init__(self, table, object_index):
+        self._table = table
+        self._object_index = object_index
+
+    def __len__(self):
+        return self._table.num_frames
+
+    def __getitem__(self, frame_num):
+        if frame_num < 0:
+            frame_num += len(self)
+        if not 0 <= frame_num < len(self):
+            raise IndexError(frame_num)
+        offsets = self._table.offsets[self._object_index]
+        return FrameTracksView(self._table, offsets[frame_num], offsets[frame_num + 1])
+
+    def __iter__(self):
+        for frame_num in range(len(self)):
+            yield self[frame_num]
+
+class FrameTracksView(Mapping):
+    """{track_id: row} view of one object in one frame"""
+
+    def __init__(self, table, start, stop):
+        self._table = table
+        self._start = start
+        self._stop = stop
+        self._index = None
+
+    def _row_index(self):
+        if self._index is None:
+            track_ids = self._table.data["track_id"][self._start:self._stop].tolist()
+            self._index = {track_id: self._start + i for i, track_id in enumerate(track_ids)}
+        return self._index
+
+    def __getitem__(self, track_id):
+        return TrackRowView(self._table, self._row_index()[track_id])
+
+    def __contains__(self, track_id):
+        return track_id in self._row_index()
+
+    def __iter__(self):
+        return iter(self._row_index())
+
+    def __len__(self):
+        return self._stop - self._start
+
+class TrackRowView(MutableMapping):
+    """Dict view of a single detection that reads and writes the table columns"""
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def _has(self, field):
+        if field == "bbox":
+            return True
+        if field in COMPUTED_FIELDS:
+            return field in self._table.computed
+        if field in ("speed", "distance"):
+            return not np.isnan(self._table.data[field][self._index])
+        if field in ("team", "team_color"):
+            return self._table.data["team"][self._index] != 0
+        if field in ("has_ball", "estimated"):
+            return bool(self._table.data[field][self._index])
+        return False
+
+    def __getitem__(self, field):
+        if not self._has(field):
+            raise KeyError(field)
+        value = self._table.data[field][self._index]
+        if field == "bbox":
+            return value.tolist()
+        if field in COMPUTED_FIELDS:
+            if np.isnan(value).any():
+                return None
+            return tuple(value.tolist()) if field != "position_transformed" else value.tolist()
+        if field == "team_color":
+            return tuple(value.tolist())
+        return value.item()
+
+    def __setitem__(self, field, value):
+        if field not in TRACK_DTYPE.names or field in ("object", "frame", "track_id"):
+            raise KeyError(f"TrackTable has no writable column '{field}'")
+        if field in COMPUTED_FIELDS:
+            self._table.computed.add(field)
+        if value is None:
+            value = np.nan
+        self._table.data[field][self._index] = value
+
+    def __delitem__(self, field):
+        if not self._has(field) or field == "bbox":
+            raise KeyError(field)
+        self._table.data[field][self._index] = empty_rows(1)[field][0]
+
+    def __iter__(self):
+        return (field for field in ("bbox",) + COMPUTED_FIELDS + OPTIONAL_FIELDS if self._has(field))
+
+    def __len__(self):
+        return sum(1 for _ in self)
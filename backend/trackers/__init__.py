@@ -1 +1,6 @@
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .sharded_detector import ShardedDetector
+from .keyframe_detector import KeyframeDetector
+from .pitch_roi import PitchROI
+from .detection_filter import DetectionFilter
+from .detector_cascade import DetectorCascade, default_escalation_rules
\ No newline at end of file
@@ -0,0 +1,220 @@
+import json
+import os
+import platform
+import time
+import torch
+
+def is_out_of_memory_error(error):
+    if isinstance(error, MemoryError):
+        return True
+    message = str(error).lower()
+    return "out of memory" in message or "can't allocate memory" in message
+
+def get_available_memory(device):
+    """Free bytes on the device (VRAM for cuda, system RAM otherwise), or None if unknown"""
+    if device == 'cuda':
+        free_bytes, _ = torch.cuda.mem_get_info()
+        return free_bytes
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        return None
+
+class AdaptiveBatchSizer:
+    """
+    Picks the detection batch size for this machine and keeps adjusting it.
+
+    At startup a single-frame probe measures inference time and memory per
+    frame. The batch then targets target_batch_time seconds of work while
+    staying within memory_fraction of the free RAM/VRAM. After every batch
+    the size moves (at most 2x per step) toward what the measured throughput
+    allows, an out-of-memory error halves it and caps it below the failing
+    size. When a pipeline keeps more batch-sized chunks of decoded frames
+    queued (see set_frames_in_flight), those count against the free RAM too,
+    as do frames it holds whatever the batch size, like a lookahead buffer.
+    The chosen size is persisted per machine, device and model_key (weights,
+    precision, input size), so the next run starts from it. An out-of-memory
+    ceiling is lifted again after reprobe_after clean runs, in case it came
+    from memory that other processes held at the time.
+    """
+
+    def __init__(self, device, profile_path='backend/models/batch_profile.json', backend='torch', model_key=None,
+                 min_batch_size=1, max_batch_size=128, target_batch_time=1.0, memory_fraction=0.5, reprobe_after=5):
+        self.device = device
+        self.backend = backend
+        self.model_key = model_key
+        self.reprobe_after = reprobe_after
+        self.profile_path = profile_path
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_batch_time = target_batch_time
+        self.memory_fraction = memory_fraction
+
+        self.batch_size = None
+        self.per_frame_time = None
+        self.per_frame_memory = None
+        self.oom_ceiling = max_batch_size
+        # Runs since the last out-of-memory error
+        self.clean_runs = 0
+        self.calibrated = False
+        # Decoded chunks of batch_size frames held in RAM besides the batch being detected
+        self.queued_batches = 0
+        self.frame_bytes = 0
+        self.held_frames = 0
+        self._load_profile()
+
+    @property
+    def machine_key(self):
+        key = f"{platform.node()}:{self.device}"
+        if self.device == 'cuda':
+            key += f":{torch.cuda.get_device_name()}"
+        if self.backend != 'torch':
+            key += f":{self.backend}"
+        if self.model_key is not None:
+            key += f":{self.model_key}"
+        return key
+
+    def _load_profile(self):
+        if not os.path.exists(self.profile_path):
+            return
+        try:
+            with open(self.profile_path) as f:
+                profile = json.load(f).get(self.machine_key)
+        except (OSError, ValueError):
+            return
+        if profile:
+            self.batch_size = int(profile["batch_size"])
+            self.per_frame_time = profile.get("per_frame_time")
+            self.per_frame_memory = profile.get("per_frame_memory")
+            self.oom_ceiling = int(profile.get("oom_ceiling", self.max_batch_size))
+            self.clean_runs = int(profile.get("clean_runs", 0)) + 1
+            self.calibrated = True
+            print(f"Loaded batch size {self.batch_size} for {self.machine_key}")
+            if self.oom_ceiling < self.max_batch_size and self.clean_runs > self.reprobe_after:
+                print(f"No out of memory error in {self.reprobe_after} runs, lifting the ceiling of {self.oom_ceiling}")
+                self.oom_ceiling = self.max_batch_size
+                self.clean_runs = 0
+            self.save_profile()
+
+    def save_profile(self):
+        profiles = {}
+        if os.path.exists(self.profile_path):
+            try:
+                with open(self.profile_path) as f:
+                    profiles = json.load(f)
+            except (OSError, ValueError):
+                profiles = {}
+        profiles[self.machine_key] = {
+            "batch_size": self.batch_size,
+            "per_frame_time": self.per_frame_time,
+            "per_frame_memory": self.per_frame_memory,
+            "oom_ceiling": self.oom_ceiling,
+            "clean_runs": self.clean_runs
+        }
+        os.makedirs(os.path.dirname(self.profile_path) or '.', exist_ok=True)
+        with open(self.profile_path, 'w') as f:
+            json.dump(profiles, f, indent=2)
+
+    def calibrate(self, predict, frame):
+        """Measure per-frame time and memory with predict([frame]) and pick the starting batch size"""
+        predict([frame])  # warm-up, the first call includes model setup
+        if self.device == 'cuda':
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            memory_before = torch.cuda.memory_allocated()
+
+        start_time = time.perf_counter()
+        predict([frame])
+        if self.device == 'cuda':
+            torch.cuda.synchronize()
+            self.per_frame_memory = max(torch.cuda.max_memory_allocated() - memory_before, frame.nbytes)
+        else:
+            # Decoded frame, letterboxed input tensor and intermediate activations
+            self.per_frame_memory = frame.nbytes * 8
+        self.per_frame_time = time.perf_counter() - start_time
+
+        self.batch_size = self._ideal_batch_size()
+        self.calibrated = True
+        print(f"Calibrated batch size {self.batch_size} for {self.machine_key} "
+              f"({self.per_frame_time*1000:.1f} ms/frame, {self.per_frame_memory/2**20:.1f} MiB/frame)")
+        self.save_profile()
+
+    def set_frames_in_flight(self, queued_batches, frame_bytes, held_frames=0):
+        """
+        Count queued_batches more chunks of batch_size frames, plus held_frames frames
+        whatever the batch size (e.g. a lookahead buffer), of frame_bytes each in the memory budget
+        """
+        self.queued_batches = queued_batches
+        self.frame_bytes = frame_bytes
+        self.held_frames = held_frames
+        if self.batch_size is not None:
+            self.batch_size = max(min(self.batch_size, self._memory_limit()), self.min_batch_size)
+
+    def _memory_limit(self):
+        limit = self.max_batch_size
+        queued_memory = self.frame_bytes * self.queued_batches
+        held_memory = self.frame_bytes * self.held_frames
+        available_memory = get_available_memory(self.device)
+        if available_memory is not None and self.per_frame_memory:
+            budget = available_memory * self.memory_fraction
+            per_frame_memory = self.per_frame_memory
+            if self.device != 'cuda':
+                # Inference, the queued and the held frames share the system RAM
+                per_frame_memory += queued_memory
+                budget = max(budget - held_memory, 0)
+            limit = int(budget // per_frame_memory)
+        if self.device == 'cuda' and queued_memory:
+            available_ram = get_available_memory('cpu')
+            if available_ram is not None:
+                available_ram = max(available_ram * self.memory_fraction - held_memory, 0)
+                limit = min(limit, int(available_ram // (queued_memory + self.frame_bytes)))
+        return limit
+
+    def _ideal_batch_size(self):
+        ideal = self.max_batch_size
+        if self.per_frame_time:
+            ideal = int(self.target_batch_time / self.per_frame_time)
+        ideal = min(ideal, self._memory_limit(), self.oom_ceiling, self.max_batch_size)
+        return max(ideal, self.min_batch_size)
+
+    def record_batch(self, batch_size, elapsed):
+        """Update the per-frame cost with a finished batch and move the batch size toward the ideal"""
+        per_frame_time = elapsed / batch_size
+        if self.per_frame_time is None:
+            self.per_frame_time = per_frame_time
+        else:
+            self.per_frame_time = 0.8 * self.per_frame_time + 0.2 * per_frame_time
+
+        # Only steer on full batches, the last partial batch of a chunk says little
+        if batch_size < self.batch_size:
+            return
+        ideal = self._ideal_batch_size()
+        grow_limit = self.batch_size * 2
+        if self.oom_ceiling < self.max_batch_size:
+            # Bisect toward the size that ran out of memory instead of doubling into it again
+            grow_limit = (self.batch_size + self.oom_ceiling + 1) // 2
+        new_batch_size = max(min(ideal, grow_limit), self.batch_size // 2, self.min_batch_size)
+        if new_batch_size != self.batch_size:
+            print(f"Batch size {self.batch_size} -> {new_batch_size} ({self.per_frame_time*1000:.1f} ms/frame)")
+            self.batch_size = new_batch_size
+            self.save_profile()
+
+    def record_out_of_memory(self, batch_size):
+        """Halve the batch after an OOM; returns False when it cannot be split any further"""
+        if batch_size <= self.min_batch_size:
+            return False
+        self.oom_ceiling = max(batch_size - 1, self.min_batch_size)
+        self.clean_runs = 0
+        self.batch_size = max(batch_size // 2, self.min_batch_size)
+        print(f"Out of memory with batch size {batch_size}, retrying with {self.batch_size}")
+        if self.device == 'cuda':
+            torch.cuda.empty_cache()
+        elif self.device == 'mps':
+            torch.mps.empty_cache()
+        self.save_profile()
+        return True
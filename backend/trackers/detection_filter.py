@@ -0,0 +1,68 @@
+import numpy as np
+
+class DetectionFilter:
+    """
+    Per-class confidence thresholds, class allow-list and per-class top-k for raw detections.
+
+    Settings are keyed by class name (e.g. {"player": 0.3, "ball": 0.1});
+    classes not listed use default_conf, classes=None allows every class and
+    max_per_class caps how many of the most confident boxes of a class are
+    kept per frame. Everything is applied with lookup tables indexed by
+    class_id, so filtering a frame is a handful of NumPy operations.
+    """
+
+    def __init__(self, class_names, default_conf=0.1, class_conf=None, classes=None, max_per_class=None):
+        self.class_names = class_names
+        self.default_conf = default_conf
+        self.class_conf = dict(class_conf or {})
+        self.classes = None if classes is None else sorted(classes)
+        self.max_per_class = dict(max_per_class or {})
+
+        num_classes = max(class_names) + 1
+        self.min_conf = np.full(num_classes, default_conf, dtype=np.float64)
+        for name, conf in self.class_conf.items():
+            self.min_conf[self._class_id(name)] = conf
+
+        self.allowed = np.ones(num_classes, dtype=bool)
+        if self.classes is not None:
+            self.allowed[:] = False
+            self.allowed[[self._class_id(name) for name in self.classes]] = True
+
+        self.top_k = np.full(num_classes, np.iinfo(np.int64).max, dtype=np.int64)
+        for name, k in self.max_per_class.items():
+            self.top_k[self._class_id(name)] = k
+
+    def _class_id(self, name):
+        for class_id, class_name in self.class_names.items():
+            if class_name == name:
+                return class_id
+        raise ValueError(f"Unknown class '{name}', the model has {sorted(self.class_names.values())}")
+
+    @property
+    def predict_conf(self):
+        # The model must not drop anything a per-class threshold would keep
+        return float(self.min_conf[self.allowed].min())
+
+    @property
+    def predict_classes(self):
+        return None if self.classes is None else np.flatnonzero(self.allowed).tolist()
+
+    def get_cache_params(self):
+        return {"default_conf": self.default_conf,
+                "class_conf": self.class_conf,
+                "classes": self.classes,
+                "max_per_class": self.max_per_class}
+
+    def __call__(self, detections):
+        """Filter one frame of sv.Detections"""
+        class_id = detections.class_id
+        keep = self.allowed[class_id] & (detections.confidence >= self.min_conf[class_id])
+        if not self.max_per_class:
+            return detections if keep.all() else detections[keep]
+
+        # Rank boxes within their class by confidence and keep the top k of each
+        candidates = np.flatnonzero(keep)
+        order = candidates[np.lexsort((-detections.confidence[candidates], class_id[candidates]))]
+        sorted_classes = class_id[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_classes, sorted_classes)
+        return detections[np.sort(order[rank < self.top_k[sorted_classes]])]
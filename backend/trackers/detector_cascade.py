@@ -0,0 +1,115 @@
+import logging
+from collections import Counter
+import numpy as np
+import supervision as sv
+
+logger = logging.getLogger(__name__)
+
+def default_escalation_rules(class_names, min_mean_conf=0.4, player_count_tolerance=3):
+    """
+    Rules for escalating a frame to the next tier, each maps
+    (detections, previous frame's detections) of the cheaper tier to True/False.
+    class_names are those of the reference tier, whose class ids the rules see.
+    """
+    class_ids = {name: class_id for class_id, name in class_names.items()}
+    person_ids = [class_ids[name] for name in ("player", "goalkeeper") if name in class_ids]
+
+    def missing_ball(detections, previous):
+        return not np.any(detections.class_id == class_ids["ball"])
+
+    def player_count_change(detections, previous):
+        if previous is None:
+            return False
+        count = np.isin(detections.class_id, person_ids).sum()
+        previous_count = np.isin(previous.class_id, person_ids).sum()
+        return abs(int(count) - int(previous_count)) > player_count_tolerance
+
+    def low_confidence(detections, previous):
+        return len(detections) == 0 or float(detections.confidence.mean()) < min_mean_conf
+
+    return {"missing_ball": missing_ball,
+            "player_count_change": player_count_change,
+            "low_confidence": low_confidence}
+
+class DetectorCascade:
+    """
+    Runs a cheap detector on every frame and escalates uncertain frames to heavier ones.
+
+    tiers is a list of (name, predict, class_names), cheapest first, where
+    predict maps a list of frames to ultralytics results. Every frame of a
+    batch goes through the first tier; frames for which any escalation rule
+    fires are re-detected together by the next tier, and so on. Class ids of
+    every tier are mapped by name to the class ids of the last (reference)
+    tier. The tier that produced each detected frame (numbered in the order
+    frames reach the cascade) and the rules that fired are kept in self.log
+    and logged at debug level.
+    """
+
+    def __init__(self, tiers, rules):
+        self.tiers = tiers
+        self.rules = rules
+        reference_ids = {name: class_id for class_id, name in tiers[-1][2].items()}
+        self.class_maps = []
+        for _, _, class_names in tiers:
+            class_map = np.full(max(class_names) + 1, -1, dtype=np.int64)
+            for class_id, name in class_names.items():
+                class_map[class_id] = reference_ids.get(name, -1)
+            self.class_maps.append(class_map)
+
+        self.reset()
+
+    def reset(self):
+        self.previous_detections = None
+        self.frames_seen = 0
+        self.log = []
+        self.stats = {"tiers": Counter(), "reasons": Counter()}
+
+    def _predict(self, tier_index, frames):
+        _, predict, _ = self.tiers[tier_index]
+        detections = []
+        for result in predict(frames):
+            frame_detections = sv.Detections.from_ultralytics(result)
+            frame_detections.class_id = self.class_maps[tier_index][frame_detections.class_id]
+            # Classes the reference model does not know are dropped
+            detections.append(frame_detections[frame_detections.class_id >= 0])
+        return detections
+
+    def _escalation_reasons(self, detections, previous):
+        return [name for name, rule in self.rules.items() if rule(detections, previous)]
+
+    def detect(self, frames):
+        """sv.Detections for every frame, in the class ids of the reference tier"""
+        detections = self._predict(0, frames)
+        tiers = np.zeros(len(frames), dtype=np.int64)
+        reasons = [[] for _ in frames]
+
+        # Rules compare against the previous frame as seen by the same tier
+        previous = [self.previous_detections] + detections[:-1]
+        self.previous_detections = detections[-1]
+        pending = []
+        for i, frame_detections in enumerate(detections):
+            reasons[i] = self._escalation_reasons(frame_detections, previous[i])
+            if reasons[i]:
+                pending.append(i)
+
+        for tier_index in range(1, len(self.tiers)):
+            if not pending:
+                break
+            tier_detections = self._predict(tier_index, [frames[i] for i in pending])
+            still_pending = []
+            for i, frame_detections in zip(pending, tier_detections):
+                detections[i] = frame_detections
+                tiers[i] = tier_index
+                if tier_index < len(self.tiers) - 1 and self._escalation_reasons(frame_detections, previous[i]):
+                    still_pending.append(i)
+            pending = still_pending
+
+        for i in range(len(frames)):
+            tier_name = self.tiers[tiers[i]][0]
+            self.log.append({"frame": self.frames_seen + i, "tier": tier_name, "reasons": reasons[i]})
+            self.stats["tiers"][tier_name] += 1
+            self.stats["reasons"].update(reasons[i])
+            logger.debug(f"Frame {self.frames_seen + i}: {tier_name} {', '.join(reasons[i])}")
+        self.frames_seen += len(frames)
+
+        return detections
@@ -0,0 +1,126 @@
+import os
+import shutil
+from pathlib import Path
+import cv2
+import numpy as np
+from ultralytics import YOLO
+import sys
+sys.path.append('../')
+from backend.utils import StubCache, get_video_info, iter_video_frames
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+def sample_calibration_frames(video_path, num_frames=64):
+    """Evenly spaced frames from the video, used to calibrate int8 quantization"""
+    frame_count = get_video_info(video_path)["frame_count"]
+    step = max(frame_count // num_frames, 1)
+    frames = []
+    for frame_num, frame in enumerate(iter_video_frames(video_path)):
+        if frame_num % step == 0:
+            frames.append(frame)
+            if len(frames) == num_frames:
+                break
+    return frames
+
+def letterbox(frame, imgsz=640):
+    """Resize and pad a BGR frame the way YOLO does, returned as a 1x3xHxW float32 RGB tensor"""
+    height, width = frame.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_height) // 2, (imgsz - new_width) // 2
+    canvas[top:top + new_height, left:left + new_width] = resized
+    return canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+
+def _quantize_onnx(model_path, output_path, calibration_frames, imgsz):
+    try:
+        import onnx
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    except ImportError as e:
+        raise ImportError("int8 ONNX export needs 'onnx' and 'onnxruntime' (pip install onnx onnxruntime)") from e
+
+    class VideoCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.inputs = iter({"images": letterbox(frame, imgsz)} for frame in calibration_frames)
+
+        def get_next(self):
+            return next(self.inputs, None)
+
+    quantize_static(model_path, output_path, VideoCalibrationReader(),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True)
+
+    # Ultralytics reads class names and stride from the model metadata, which quantization drops
+    source, quantized = onnx.load(model_path), onnx.load(output_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, output_path)
+
+def _write_calibration_dataset(dataset_dir, calibration_frames, names):
+    """Minimal YOLO dataset (images only) that the OpenVINO/NNCF int8 export calibrates on"""
+    image_dir = os.path.join(dataset_dir, "images", "val")
+    os.makedirs(image_dir, exist_ok=True)
+    for i, frame in enumerate(calibration_frames):
+        cv2.imwrite(os.path.join(image_dir, f"{i:04d}.jpg"), frame)
+
+    yaml_path = os.path.join(dataset_dir, "calibration.yaml")
+    with open(yaml_path, "w") as f:
+        f.write(f"path: {os.path.abspath(dataset_dir)}\n")
+        f.write("train: images/val\nval: images/val\nnames:\n")
+        for class_id, name in names.items():
+            f.write(f"  {class_id}: {name}\n")
+    return yaml_path
+
+def export_model(model_path, backend='onnx', int8=False, calibration_video=None, imgsz=640,
+                 export_dir='backend/models/exported', calibration_frames=64):
+    """
+    Export the PyTorch weights to ONNX or OpenVINO once and return the path of the exported model.
+
+    Exports are cached in export_dir under a name derived from the weights'
+    content hash, the input size and the precision, so they are rebuilt only
+    when the weights change. int8 models are calibrated on frames sampled from
+    calibration_video.
+    """
+    if backend == 'torch':
+        return model_path
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    if int8 and calibration_video is None:
+        raise ValueError("int8 quantization needs a calibration_video to sample frames from")
+
+    name = f"{Path(model_path).stem}_{StubCache.hash_file(model_path)[:12]}_{imgsz}{'_int8' if int8 else ''}"
+    if backend == 'onnx':
+        target_path = os.path.join(export_dir, f"{name}.onnx")
+    else:
+        # Ultralytics recognizes OpenVINO models by the _openvino_model suffix
+        target_path = os.path.join(export_dir, f"{name}_openvino_model")
+    if os.path.exists(target_path):
+        return target_path
+
+    os.makedirs(export_dir, exist_ok=True)
+    print(f"Exporting {model_path} to {backend}{' int8' if int8 else ''}, this only happens once")
+    model = YOLO(model_path)
+    frames = sample_calibration_frames(calibration_video, calibration_frames) if int8 else None
+
+    if backend == 'onnx':
+        exported_path = model.export(format='onnx', imgsz=imgsz, dynamic=True)
+        if int8:
+            _quantize_onnx(exported_path, target_path, frames, imgsz)
+            os.remove(exported_path)
+        else:
+            shutil.move(exported_path, target_path)
+    else:
+        export_args = {}
+        if int8:
+            dataset_dir = os.path.join(export_dir, f"{name}_calibration")
+            export_args = {"int8": True, "data": _write_calibration_dataset(dataset_dir, frames, model.names)}
+        exported_path = model.export(format='openvino', imgsz=imgsz, dynamic=True, **export_args)
+        shutil.move(exported_path, target_path)
+        if int8:
+            shutil.rmtree(dataset_dir, ignore_errors=True)
+
+    return target_path
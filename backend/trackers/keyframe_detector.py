@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+import supervision as sv
+
+# Points tracked inside every box, on a 3x3 grid over its inner half
+GRID = np.stack(np.meshgrid([0.25, 0.5, 0.75], [0.25, 0.5, 0.75]), axis=-1).reshape(-1, 2).astype(np.float32)
+
+class KeyframeDetector:
+    """
+    Runs the detector only on keyframes and moves the boxes along with optical flow in between.
+
+    Keyframes are every keyframe_interval frames, plus any frame whose mean
+    absolute difference to the previous one exceeds motion_threshold (cuts,
+    replays, fast pans). They are planned per chunk, so all of them go to the
+    detector as one batch. Every box of the previous frame is then propagated
+    by the median Lucas-Kanade displacement of a grid of points inside it.
+    Boxes whose points are all lost are dropped. When more than
+    max_lost_fraction of the boxes are lost, that frame is detected as well.
+    """
+
+    def __init__(self, detect, keyframe_interval=3, motion_threshold=30.0, max_lost_fraction=0.3, flow_scale=0.5):
+        self.detect = detect
+        self.keyframe_interval = keyframe_interval
+        self.motion_threshold = motion_threshold
+        self.max_lost_fraction = max_lost_fraction
+        self.flow_scale = flow_scale
+        self.lk_params = dict(winSize=(15, 15),
+                              maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+        self.previous_gray = None
+        self.previous_detections = None
+        self.frames_since_keyframe = 0
+        self.stats = {"detected": 0, "propagated": 0, "forced": 0}
+
+    def get_cache_params(self):
+        return {"keyframe_interval": self.keyframe_interval,
+                "motion_threshold": self.motion_threshold,
+                "max_lost_fraction": self.max_lost_fraction,
+                "flow_scale": self.flow_scale}
+
+    def _to_gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, None, fx=self.flow_scale, fy=self.flow_scale, interpolation=cv2.INTER_AREA)
+
+    def _plan_keyframes(self, grays):
+        is_keyframe = np.zeros(len(grays), dtype=bool)
+        previous_gray, frames_since_keyframe = self.previous_gray, self.frames_since_keyframe
+        for i, gray in enumerate(grays):
+            frames_since_keyframe += 1
+            if (previous_gray is None or frames_since_keyframe >= self.keyframe_interval
+                    or np.mean(cv2.absdiff(gray, previous_gray)) > self.motion_threshold):
+                is_keyframe[i] = True
+                frames_since_keyframe = 0
+            previous_gray = gray
+        return is_keyframe
+
+    def _detect(self, frames):
+        self.stats["detected"] += len(frames)
+        return [result if isinstance(result, sv.Detections) else sv.Detections.from_ultralytics(result)
+                for result in self.detect(frames)]
+
+    def propagate(self, previous_gray, gray, detections):
+        """Move detections from previous_gray to gray, returns (detections, fraction of boxes lost)"""
+        if len(detections) == 0:
+            return detections[np.zeros(0, dtype=bool)], 0.0
+
+        boxes = detections.xyxy.astype(np.float32) * self.flow_scale
+        points = boxes[:, None, :2] + GRID[None] * (boxes[:, None, 2:] - boxes[:, None, :2])
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(previous_gray, gray, points.reshape(-1, 1, 2), None, **self.lk_params)
+
+        status = status.reshape(len(boxes), len(GRID)).astype(bool)
+        displacement = new_points.reshape(len(boxes), len(GRID), 2) - points
+        lost = ~status.any(axis=1)
+        displacement[~status] = np.nan
+        displacement[lost] = 0
+        shift = np.nanmedian(displacement, axis=1) / self.flow_scale
+
+        propagated = detections[~lost]
+        propagated.xyxy = propagated.xyxy + np.tile(shift[~lost], 2).astype(propagated.xyxy.dtype)
+        return propagated, float(lost.mean())
+
+    def detect_frames(self, frames):
+        """Detections for every frame as sv.Detections, continuing from the previous chunk"""
+        grays = [self._to_gray(frame) for frame in frames]
+        is_keyframe = self._plan_keyframes(grays)
+        keyframes = np.flatnonzero(is_keyframe)
+        keyframe_detections = dict(zip(keyframes.tolist(), self._detect([frames[i] for i in keyframes])))
+
+        detections = []
+        for i, gray in enumerate(grays):
+            if is_keyframe[i]:
+                frame_detections = keyframe_detections[i]
+                self.frames_since_keyframe = 0
+            else:
+                frame_detections, lost_fraction = self.propagate(self.previous_gray, gray, self.previous_detections)
+                self.frames_since_keyframe += 1
+                if lost_fraction > self.max_lost_fraction:
+                    # Flow lost track of too many boxes, detect this frame too
+                    frame_detections = self._detect([frames[i]])[0]
+                    self.stats["forced"] += 1
+                else:
+                    self.stats["propagated"] += 1
+
+            detections.append(frame_detections)
+            self.previous_gray = gray
+            self.previous_detections = frame_detections
+
+        return detections
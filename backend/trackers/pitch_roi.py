@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+import supervision as sv
+
+class PitchROI:
+    """
+    Restricts detection to the pitch.
+
+    The pitch is found as the largest grass-colored region of a downscaled
+    frame (closed, convex hull, grown by margin), or given as a fixed pixel
+    polygon for static cameras. Every frame is cropped to its pitch box (with
+    head_room above for players standing on the far line), snapped outward
+    to a grid of 1/grid of the frame, before inference, so the stands and
+    advertising boards are never processed. Frames with the same crop are
+    detected together, so the crop and the detections of a frame do not
+    depend on the batch it is in. Detections whose foot point falls outside
+    the pitch are dropped before they reach the tracker. Frames with less
+    than min_grass_fraction grass (close-ups, crowd shots) are left uncropped.
+
+    stats compares the letterboxed detector input (imgsz, padded to stride)
+    of the full frames and of the crops, which is what inference costs.
+    """
+
+    def __init__(self, polygon=None, scale=0.125, grass_lower=(35, 40, 40), grass_upper=(85, 255, 255),
+                 margin=0.03, head_room=0.1, min_grass_fraction=0.1, grid=8, imgsz=640, stride=32):
+        self.polygon = None if polygon is None else np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+        self.scale = scale
+        self.grass_lower = np.array(grass_lower, dtype=np.uint8)
+        self.grass_upper = np.array(grass_upper, dtype=np.uint8)
+        self.margin = margin
+        self.head_room = head_room
+        self.min_grass_fraction = min_grass_fraction
+        self.grid = grid
+        self.imgsz = imgsz
+        self.stride = stride
+        self.stats = {"pixels": 0, "pixels_inferred": 0, "boxes": 0, "boxes_dropped": 0}
+
+    def get_cache_params(self):
+        return {"polygon": None if self.polygon is None else self.polygon.tolist(),
+                "scale": self.scale,
+                "grass": [self.grass_lower.tolist(), self.grass_upper.tolist()],
+                "margin": self.margin,
+                "head_room": self.head_room,
+                "min_grass_fraction": self.min_grass_fraction,
+                "grid": self.grid}
+
+    def mask(self, frame):
+        """Downscaled boolean pitch mask of a frame"""
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        height, width = small.shape[:2]
+        pitch = np.zeros((height, width), dtype=np.uint8)
+
+        if self.polygon is not None:
+            cv2.fillPoly(pitch, [np.round(self.polygon * self.scale).astype(np.int32)], 1)
+        else:
+            grass = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2HSV), self.grass_lower, self.grass_upper)
+            # Close over lines and players, then keep the largest grass region
+            grass = cv2.morphologyEx(grass, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+            num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(grass)
+            if num_labels < 2:
+                return np.ones((height, width), dtype=bool)
+            largest = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+            if stats[largest, cv2.CC_STAT_AREA] < self.min_grass_fraction * height * width:
+                return np.ones((height, width), dtype=bool)
+            points = cv2.findNonZero((labels == largest).astype(np.uint8))
+            cv2.fillConvexPoly(pitch, cv2.convexHull(points), 1)
+
+        margin = int(np.ceil(self.margin * height))
+        if margin > 0:
+            pitch = cv2.dilate(pitch, np.ones((2 * margin + 1, 2 * margin + 1), np.uint8))
+        return pitch.astype(bool)
+
+    def crop_box(self, masks, frame_shape):
+        """Full resolution (x1, y1, x2, y2) covering the pitch in all masks, snapped outward to the grid"""
+        frame_height, frame_width = frame_shape[:2]
+        union = np.logical_or.reduce(masks)
+        rows, columns = np.flatnonzero(union.any(axis=1)), np.flatnonzero(union.any(axis=0))
+        if len(rows) == 0:
+            return 0, 0, frame_width, frame_height
+        x1 = max(columns[0] / self.scale, 0)
+        x2 = min((columns[-1] + 1) / self.scale, frame_width)
+        y1 = max(rows[0] / self.scale - self.head_room * frame_height, 0)
+        y2 = min((rows[-1] + 1) / self.scale, frame_height)
+        # Few distinct crop sizes, so frames can still be batched with equally sized images
+        cell_width, cell_height = frame_width / self.grid, frame_height / self.grid
+        x1 = int(np.floor(x1 / cell_width) * cell_width)
+        y1 = int(np.floor(y1 / cell_height) * cell_height)
+        x2 = min(int(np.ceil(np.ceil(x2 / cell_width) * cell_width)), frame_width)
+        y2 = min(int(np.ceil(np.ceil(y2 / cell_height) * cell_height)), frame_height)
+        return x1, y1, x2, y2
+
+    def letterboxed_pixels(self, height, width):
+        """Pixels of the detector input for a height x width image, resized to imgsz and padded to stride"""
+        ratio = min(self.imgsz / height, self.imgsz / width)
+        new_height, new_width = round(height * ratio), round(width * ratio)
+        return int(np.ceil(new_height / self.stride) * self.stride * np.ceil(new_width / self.stride) * self.stride)
+
+    def filter(self, detections, mask):
+        """Drop detections whose bottom center lies outside the pitch mask"""
+        height, width = mask.shape
+        x = np.clip(((detections.xyxy[:, 0] + detections.xyxy[:, 2]) / 2 * self.scale).astype(int), 0, width - 1)
+        y = np.clip((detections.xyxy[:, 3] * self.scale).astype(int), 0, height - 1)
+        keep = mask[y, x]
+        self.stats["boxes"] += len(keep)
+        self.stats["boxes_dropped"] += int((~keep).sum())
+        return detections[keep]
+
+    def detect(self, predict, frames):
+        """Run predict on the pitch crop of every frame, returns sv.Detections in full frame coordinates"""
+        masks = [self.mask(frame) for frame in frames]
+        boxes = [self.crop_box([mask], frame.shape) for frame, mask in zip(frames, masks)]
+        # One predict call per distinct crop, YOLO letterboxes equally sized images without square padding
+        groups = {}
+        for i, box in enumerate(boxes):
+            groups.setdefault(box, []).append(i)
+
+        detections = [None] * len(frames)
+        for (x1, y1, x2, y2), indices in groups.items():
+            results = predict([frames[i][y1:y2, x1:x2] for i in indices])
+            for i, result in zip(indices, results):
+                frame_detections = result if isinstance(result, sv.Detections) else sv.Detections.from_ultralytics(result)
+                frame_detections.xyxy = frame_detections.xyxy + np.array([x1, y1, x1, y1], dtype=frame_detections.xyxy.dtype)
+                detections[i] = self.filter(frame_detections, masks[i])
+            self.stats["pixels_inferred"] += self.letterboxed_pixels(y2 - y1, x2 - x1) * len(indices)
+
+        self.stats["pixels"] += sum(self.letterboxed_pixels(*frame.shape[:2]) for frame in frames)
+        return detections
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+import numpy as np
+import supervision as sv
+
+_worker_model = None
+_worker_conf = None
+_worker_classes = None
+
+def _init_worker(model_path, conf, classes, num_threads):
+    global _worker_model, _worker_conf, _worker_classes
+    import cv2
+    import torch
+    from ultralytics import YOLO
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(num_threads)
+    cv2.setNumThreads(1)
+    _worker_model = YOLO(model_path, task='detect')
+    _worker_conf = conf
+    _worker_classes = classes
+
+def _detect_shard(shm_name, shape):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        results = _worker_model.predict(list(frames), conf=_worker_conf, classes=_worker_classes,
+                                         device='cpu', verbose=False)
+        del frames
+        return [sv.Detections.from_ultralytics(result) for result in results]
+    finally:
+        shm.close()
+
+class ShardedDetector:
+    """
+    Runs YOLO detection in a pool of worker processes, one model per worker.
+
+    Frame shards are copied once into shared-memory slots that the workers
+    read in place, so only the compact detections travel back through pickling.
+    Results come back in submission order, so ByteTrack can keep running
+    in the parent over a single continuous stream of detections and track
+    IDs stay the same as with serial detection.
+    """
+
+    def __init__(self, model_path, num_workers=None, conf=0.1, max_pending=None, classes=None):
+        self.num_workers = num_workers or os.cpu_count()
+        # Keep every worker busy while the next shard is being copied in
+        self.max_pending = max_pending or 2 * self.num_workers
+        self.executor = ProcessPoolExecutor(self.num_workers,
+                                            mp_context=get_context('spawn'),
+                                            initializer=_init_worker,
+                                            initargs=(model_path, conf, classes, max(os.cpu_count() // self.num_workers, 1)))
+        self._free_slots = []
+        self._slots = []
+        self._lock = threading.Lock()
+
+    def _acquire_slot(self, nbytes):
+        with self._lock:
+            for i, slot in enumerate(self._free_slots):
+                if slot.size >= nbytes:
+                    return self._free_slots.pop(i)
+        slot = shared_memory.SharedMemory(create=True, size=nbytes)
+        with self._lock:
+            self._slots.append(slot)
+        return slot
+
+    def submit(self, frames):
+        """Start detecting a shard of frames, returns a handle for result()"""
+        shape = (len(frames),) + frames[0].shape
+        slot = self._acquire_slot(int(np.prod(shape)))
+        buffer = np.ndarray(shape, dtype=np.uint8, buffer=slot.buf)
+        np.stack(frames, out=buffer)
+        del buffer
+        return slot, self.executor.submit(_detect_shard, slot.name, shape)
+
+    def result(self, handle):
+        """Wait for a shard and return its sv.Detections, one per frame"""
+        slot, future = handle
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                self._free_slots.append(slot)
+
+    def detect_chunks(self, frame_chunks):
+        """Yield the detections of every chunk in order, with up to max_pending chunks in flight"""
+        pending = deque()
+        for frames in frame_chunks:
+            pending.append(self.submit(frames))
+            if len(pending) >= self.max_pending:
+                yield self.result(pending.popleft())
+        while pending:
+            yield self.result(pending.popleft())
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        self._slots = []
+        self._free_slots = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
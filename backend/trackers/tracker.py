@@ -1,232 +1,320 @@
 from ultralytics import YOLO
 import supervision as sv
-import pickle
-import os
 import numpy as np
-import pandas as pd
 import cv2
 import sys 
 sys.path.append('../')
-from backend.utils import get_center_of_bbox, get_bbox_width, get_foot_position
+from backend.utils import StubCache, iter_chunks
+from backend.track_table import TrackTable, TrackTableBuilder, OBJECTS, make_rows, add_position_to_tracks
+from backend.ball_tracker import fill_gaps
+from backend.frame_annotator import draw_ellipse, draw_triangle, blend_panel
 import torch
+import threading
+import time
+from .batch_sizer import AdaptiveBatchSizer, is_out_of_memory_error
+from .inference_backend import export_model
+from .sharded_detector import ShardedDetector
+from .keyframe_detector import KeyframeDetector
+from .detection_filter import DetectionFilter
+from .detector_cascade import DetectorCascade, default_escalation_rules
 
 class Tracker:
-    def __init__(self, model_path):
-        # Determine device
+    def __init__(self, model_path, backend='torch', int8=False, calibration_video=None, keyframe_interval=1, pitch_roi=None,
+                 class_conf=None, classes=None, max_per_class=None, light_model_path=None, escalation_rules=None):
+        if int8 and backend == 'torch':
+            raise ValueError("int8 quantization needs an exported backend ('onnx' or 'openvino'), torch runs in fp32/fp16")
+        # Determine device, exported ONNX/OpenVINO models always run on the CPU
         self.device = 'cpu'
-        if torch.cuda.is_available():
+        if backend == 'torch' and torch.cuda.is_available():
             self.device = 'cuda'
             torch.cuda.empty_cache()
-        elif torch.backends.mps.is_available():
+        elif backend == 'torch' and torch.backends.mps.is_available():
             self.device = 'mps'
             torch.mps.empty_cache()
             
-        print(f"Using device: {self.device}")
+        print(f"Using device: {self.device} ({backend}{' int8' if int8 else ''})")
             
-        self.model = YOLO(model_path)
-        self.model.to(self.device)
+        self.model_path = model_path
+        self.backend = backend
+        self.int8 = int8
+        self.conf = 0.1
+        # The weights actually loaded, also used by the sharded detection workers
+        self.inference_model_path = export_model(model_path, backend, int8=int8, calibration_video=calibration_video)
+        self.model = YOLO(self.inference_model_path, task='detect')
+        if backend == 'torch':
+            self.model.to(self.device)
+        # Model.predict sets the predictor's conf/classes/imgsz before taking its own lock, so calls
+        # from the detect and ball search stages must not overlap
+        self.predict_lock = threading.Lock()
+        self._build_class_lookups()
+        # Per-class thresholds, allow-list and top-k, conf stays the default threshold
+        self.detection_filter = DetectionFilter(self.model.names, self.conf, class_conf, classes, max_per_class)
+
+        # Optional cascade: a small model on every frame, this model only where the small one is unsure
+        self.light_model_path = light_model_path
+        self.cascade = None
+        if light_model_path is not None:
+            light_model_path = export_model(light_model_path, backend, int8=int8, calibration_video=calibration_video)
+            self.light_model = YOLO(light_model_path, task='detect')
+            if backend == 'torch':
+                self.light_model.to(self.device)
+            if escalation_rules is None:
+                escalation_rules = default_escalation_rules(self.model.names)
+            self.cascade = DetectorCascade([("light", lambda batch: self._predict_with(self.light_model, batch), self.light_model.names),
+                                            ("heavy", lambda batch: self._predict_with(self.model, batch), self.model.names)],
+                                           escalation_rules)
         self.tracker = sv.ByteTrack()
+        # Optional PitchROI, crops inference to the pitch and drops off-field boxes before tracking
+        self.pitch_roi = pitch_roi
+        self.batch_sizer = AdaptiveBatchSizer(self.device, backend=backend, model_key=self._batch_profile_key())
+        # Detect only every keyframe_interval frames and propagate boxes with optical flow in between
+        self.keyframe_detector = None
+        if keyframe_interval > 1:
+            self.keyframe_detector = KeyframeDetector(self.detect_every_frame, keyframe_interval)
+
+    def get_cache_params(self):
+        # Everything besides the video and the weights that changes the tracks
+        return {"conf": self.detection_filter.get_cache_params(), "tracker": "ByteTrack", "goalkeeper_as_player": True,
+                "backend": self.backend, "int8": self.int8,
+                "keyframes": self.keyframe_detector.get_cache_params() if self.keyframe_detector else None,
+                "pitch_roi": self.pitch_roi.get_cache_params() if self.pitch_roi else None,
+                "cascade": {"light_model": StubCache.hash_file(self.light_model_path),
+                            "rules": sorted(self.cascade.rules)} if self.cascade else None}
 
     def add_position_to_tracks(sekf,tracks):
-        for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    bbox = track_info['bbox']
-                    if object == 'ball':
-                        position= get_center_of_bbox(bbox)
-                    else:
-                        position = get_foot_position(bbox)
-                    tracks[object][frame_num][track_id]['position'] = position
+        add_position_to_tracks(tracks)
 
     def interpolate_ball_positions(self,ball_positions):
-        ball_positions = [x.get(1,{}).get('bbox',[]) for x in ball_positions]
-        df_ball_positions = pd.DataFrame(ball_positions,columns=['x1','y1','x2','y2'])
+        ball_positions = [x.get(1,{}).get('bbox',[np.nan]*4) for x in ball_positions]
 
-        # Interpolate missing values
-        df_ball_positions = df_ball_positions.interpolate()
-        df_ball_positions = df_ball_positions.bfill()
+        # Interpolate missing values over the whole video, see BallTracker for bounded gaps
+        ball_positions, _ = fill_gaps(ball_positions)
 
-        ball_positions = [{1: {"bbox":x}} for x in df_ball_positions.to_numpy().tolist()]
+        ball_positions = [{1: {"bbox":x}} for x in ball_positions.tolist()]
 
         return ball_positions
 
+    def _batch_profile_key(self):
+        # Memory and time per frame depend on the weights, the precision and the input size
+        precision = 'int8' if self.int8 else 'fp16' if self._use_half_precision() else 'fp32'
+        key = f"{StubCache.hash_file(self.model_path)[:12]}:{precision}:{self.model.overrides.get('imgsz', 640)}"
+        if self.cascade is not None:
+            key += f":light={StubCache.hash_file(self.light_model_path)[:12]}"
+        if self.pitch_roi is not None:
+            key += ":roi"
+        return key
+
+    def _use_half_precision(self):
+        # fp16 inference is only supported on CUDA, CPU and MPS run in fp32
+        return self.device == 'cuda'
+
+    def _predict_batch(self, batch):
+        if self.pitch_roi is not None:
+            return self.pitch_roi.detect(self._predict_frames, batch)
+        return self._predict_frames(batch)
+
+    def _predict_frames(self, batch):
+        if self.cascade is not None:
+            return self.cascade.detect(batch)
+        return self._predict_with(self.model, batch)
+
+    def _predict_classes(self, model):
+        # The allow-list is kept by class name, the cascade's models may number their classes differently
+        if self.detection_filter.classes is None:
+            return None
+        return [class_id for class_id, name in model.names.items() if name in self.detection_filter.classes]
+
+    def _predict_with(self, model, batch):
+        with self.predict_lock, torch.no_grad():
+            return model.predict(
+                batch, 
+                conf=self.detection_filter.predict_conf,
+                classes=self._predict_classes(model),
+                device=self.device,
+                half=self._use_half_precision()
+            )
+
+    def detect_ball(self, tiles, imgsz=640):
+        """Ball-only detection on full resolution tiles, see BallSearch"""
+        with self.predict_lock, torch.no_grad():
+            return self.model.predict(
+                tiles,
+                conf=float(self.detection_filter.min_conf[self.ball_class_id]),
+                classes=[self.ball_class_id],
+                imgsz=imgsz,
+                device=self.device,
+                half=self._use_half_precision(),
+                verbose=False
+            )
+
+    def _fall_back_to_cpu(self, error):
+        print(f"RuntimeError occurred with {self.device} ({error}), continuing on CPU from the failing batch")
+        with self.predict_lock:
+            self.device = 'cpu'
+            self.model.to('cpu')
+            if self.cascade is not None:
+                self.light_model.to('cpu')
+        batch_sizer = self.batch_sizer
+        self.batch_sizer = AdaptiveBatchSizer(self.device, backend=self.backend, model_key=self._batch_profile_key())
+        self.batch_sizer.set_frames_in_flight(batch_sizer.queued_batches, batch_sizer.frame_bytes,
+                                              batch_sizer.held_frames)
+
     def detect_frames(self, frames):
-        # Reduce batch size to prevent memory issues
-        batch_size = 25
+        if self.keyframe_detector is not None:
+            return self.keyframe_detector.detect_frames(frames)
+        return self.detect_every_frame(frames)
+
+    def detect_every_frame(self, frames):
         detections = []
         
-        try:
-            print(f"Attempting detection with {self.device}")
-            for i in range(0, len(frames), batch_size):
-                batch = frames[i:i+batch_size]
-                if self.device == 'cuda':
-                    torch.cuda.empty_cache()
-                
-                with torch.no_grad():
-                    detections_batch = self.model.predict(
-                        batch, 
-                        conf=0.1, 
-                        device=self.device,
-                        half=True
-                    )
-                detections += detections_batch
-                
-                del detections_batch
-                if self.device == 'cuda':
-                    torch.cuda.empty_cache()
-                
-        except RuntimeError as e:
-            print(f"RuntimeError occurred with {self.device}, falling back to CPU")
-            self.device = 'cpu'
-            self.model.to('cpu')
-            # Retry with CPU
-            for i in range(0, len(frames), batch_size):
-                batch = frames[i:i+batch_size]
-                detections_batch = self.model.predict(batch, conf=0.1, device='cpu')
-                detections += detections_batch
+        i = 0
+        while i < len(frames):
+            batch = frames[i:i+1]
+            try:
+                # Probe per-frame cost and free memory once, then adapt the batch size as we go
+                if not self.batch_sizer.calibrated:
+                    self.batch_sizer.calibrate(self._predict_batch, frames[i])
+                    if self.cascade is not None:
+                        # The probe frames are not part of the video, start the cascade log afresh
+                        self.cascade.reset()
+
+                batch = frames[i:i+self.batch_sizer.batch_size]
+                start_time = time.perf_counter()
+                detections_batch = self._predict_batch(batch)
+            except (RuntimeError, MemoryError) as e:
+                # Split the failing batch instead of giving up on it
+                if is_out_of_memory_error(e) and self.batch_sizer.record_out_of_memory(len(batch)):
+                    continue
+                if self.device == 'cpu':
+                    raise
+                # Keep the batches finished on the accelerator and resume from this one on CPU
+                self._fall_back_to_cpu(e)
+                continue
+
+            self.batch_sizer.record_batch(len(batch), time.perf_counter() - start_time)
+            detections += detections_batch
+            i += len(batch)
                 
         return detections
 
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path,'rb') as f:
-                tracks = pickle.load(f)
-            return tracks
-
+    def check_sharded_detection(self):
+        # Workers run the plain model on every frame, the cache key must not claim otherwise
+        unsupported = [name for name, enabled in (("keyframe_interval", self.keyframe_detector is not None),
+                                                  ("pitch_roi", self.pitch_roi is not None),
+                                                  ("light_model_path", self.cascade is not None)) if enabled]
+        if unsupported:
+            raise ValueError(f"{', '.join(unsupported)} cannot be combined with num_workers > 1, "
+                             "sharded detection runs the full model on every frame")
+
+    def get_object_tracks(self, frames, chunk_size=64, num_workers=1):
+        # Cached by VideoAnalysisPipeline through StubCache, keyed by video content and get_cache_params
+        tracks = TrackTableBuilder()
+
+        # frames may be any iterable (e.g. iter_video_frames), only chunk_size frames are held at once
+        if num_workers > 1:
+            self.check_sharded_detection()
+            # Detect chunks in parallel worker processes, tracking stays here in frame order
+            with ShardedDetector(self.inference_model_path, num_workers, self.detection_filter.predict_conf,
+                                 classes=self.detection_filter.predict_classes) as detector:
+                for detections in detector.detect_chunks(iter_chunks(frames, chunk_size)):
+                    self.add_detections_to_tracks(tracks, detections)
+        else:
+            for chunk in iter_chunks(frames, chunk_size):
+                self.update_tracks(tracks, chunk)
+
+        return tracks.build()
+
+    def update_tracks(self, tracks, frames):
+        # Detect and track a chunk of frames, appending the results after the frames already in tracks
         detections = self.detect_frames(frames)
-
-        tracks={
-            "players":[],
-            "referees":[],
-            "ball":[]
-        }
-
-        for frame_num, detection in enumerate(detections):
-            cls_names = detection.names
-            cls_names_inv = {v:k for k,v in cls_names.items()}
-
-            # Covert to supervision Detection format
-            detection_supervision = sv.Detections.from_ultralytics(detection)
-
+        return self.add_detections_to_tracks(tracks, detections)
+
+    def _build_class_lookups(self):
+        # Model class id -> class id used for tracking (goalkeepers become players) and -> TrackTable object
+        cls_names = self.model.names
+        cls_names_inv = {v:k for k,v in cls_names.items()}
+        self.class_remap = np.arange(max(cls_names) + 1)
+        if "goalkeeper" in cls_names_inv:
+            self.class_remap[cls_names_inv["goalkeeper"]] = cls_names_inv["player"]
+        self.class_to_object = np.full(max(cls_names) + 1, -1, dtype=np.int8)
+        for name, object_name in (("player", "players"), ("referee", "referees"), ("ball", "ball")):
+            self.class_to_object[cls_names_inv[name]] = TrackTable.object_index(object_name)
+        self.ball_class_id = cls_names_inv["ball"]
+
+    def detections_to_rows(self, detections, start_frame=0):
+        """Track a chunk of detections and return its TrackTable rows, numbered from start_frame"""
+        players, referees, ball = (TrackTable.object_index(name) for name in ("players", "referees", "ball"))
+        object_ids, frames, track_ids, bboxes = [], [], [], []
+
+        # detections are ultralytics results, or sv.Detections when they come from a ShardedDetector
+        for frame_num, detection in enumerate(detections, start_frame):
+            if not isinstance(detection, sv.Detections):
+                detection = sv.Detections.from_ultralytics(detection)
+            detection = self.detection_filter(detection)
             # Convert GoalKeeper to player object
-            for object_ind , class_id in enumerate(detection_supervision.class_id):
-                if cls_names[class_id] == "goalkeeper":
-                    detection_supervision.class_id[object_ind] = cls_names_inv["player"]
+            detection.class_id = self.class_remap[detection.class_id]
 
             # Track Objects
-            detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
-
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
-
-            for frame_detection in detection_with_tracks:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
-
-                if cls_id == cls_names_inv['player']:
-                    tracks["players"][frame_num][track_id] = {"bbox":bbox}
-                
-                if cls_id == cls_names_inv['referee']:
-                    tracks["referees"][frame_num][track_id] = {"bbox":bbox}
-            
-            for frame_detection in detection_supervision:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-
-                if cls_id == cls_names_inv['ball']:
-                    tracks["ball"][frame_num][1] = {"bbox":bbox}
-
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(tracks,f)
-
+            detection_with_tracks = self.tracker.update_with_detections(detection)
+
+            tracked_objects = self.class_to_object[detection_with_tracks.class_id]
+            tracked = np.flatnonzero((tracked_objects == players) | (tracked_objects == referees))
+            # The ball is not tracked, when there are several detections the last one wins
+            balls = np.flatnonzero(self.class_to_object[detection.class_id] == ball)[-1:]
+
+            object_ids += [tracked_objects[tracked], np.full(len(balls), ball)]
+            track_ids += [detection_with_tracks.tracker_id[tracked], np.ones(len(balls), int)]
+            bboxes += [detection_with_tracks.xyxy[tracked], detection.xyxy[balls]]
+            frames.append(np.full(len(tracked) + len(balls), frame_num))
+
+        if not frames:
+            return make_rows([], [], [], np.empty((0, 4)))
+        return make_rows(np.concatenate(object_ids), np.concatenate(frames),
+                         np.concatenate(track_ids), np.concatenate(bboxes))
+
+    def add_detections_to_tracks(self, tracks, detections):
+        """Append a chunk of detections to a TrackTableBuilder (returns the new rows) or a nested tracks dict"""
+        if isinstance(tracks, TrackTableBuilder):
+            rows = self.detections_to_rows(detections, tracks.num_frames)
+            return tracks.append(rows, len(detections))
+
+        start_frame = len(tracks["players"])
+        rows = self.detections_to_rows(detections, start_frame)
+        for object_name in OBJECTS:
+            tracks[object_name].extend({} for _ in detections)
+        for object_index, frame_num, track_id, bbox in zip(rows["object"].tolist(), rows["frame"].tolist(),
+                                                           rows["track_id"].tolist(), rows["bbox"].tolist()):
+            tracks[OBJECTS[object_index]][frame_num][track_id] = {"bbox":bbox}
         return tracks
     
     def draw_ellipse(self,frame,bbox,color,track_id=None):
-        y2 = int(bbox[3])
-        x_center, _ = get_center_of_bbox(bbox)
-        width = get_bbox_width(bbox)
-
-        cv2.ellipse(
-            frame,
-            center=(x_center,y2),
-            axes=(int(width), int(0.35*width)),
-            angle=0.0,
-            startAngle=-45,
-            endAngle=235,
-            color = color,
-            thickness=2,
-            lineType=cv2.LINE_4
-        )
-
-        rectangle_width = 40
-        rectangle_height=20
-        x1_rect = x_center - rectangle_width//2
-        x2_rect = x_center + rectangle_width//2
-        y1_rect = (y2- rectangle_height//2) +15
-        y2_rect = (y2+ rectangle_height//2) +15
-
-        if track_id is not None:
-            cv2.rectangle(frame,
-                          (int(x1_rect),int(y1_rect) ),
-                          (int(x2_rect),int(y2_rect)),
-                          color,
-                          cv2.FILLED)
-            
-            x1_text = x1_rect+12
-            if track_id > 99:
-                x1_text -=10
-            
-            cv2.putText(
-                frame,
-                f"{track_id}",
-                (int(x1_text),int(y1_rect+15)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                (0,0,0),
-                2
-            )
-
-        return frame
+        return draw_ellipse(frame, bbox, color, track_id)
 
     def draw_traingle(self,frame,bbox,color):
-        y= int(bbox[1])
-        x,_ = get_center_of_bbox(bbox)
-
-        triangle_points = np.array([
-            [x,y],
-            [x-10,y-20],
-            [x+10,y-20],
-        ])
-        cv2.drawContours(frame, [triangle_points],0,color, cv2.FILLED)
-        cv2.drawContours(frame, [triangle_points],0,(0,0,0), 2)
-
-        return frame
+        return draw_triangle(frame, bbox, color)
 
     def draw_team_ball_control(self,frame,frame_num,team_ball_control):
-        # Draw a semi-transparent rectaggle 
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (1350, 850), (1900,970), (255,255,255), -1 )
-        alpha = 0.4
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+        # Draw a semi-transparent rectangle, blended over its own pixels only
+        blend_panel(frame, (1350, 850), (1900, 970), alpha=0.4)
 
         team_ball_control_till_frame = team_ball_control[:frame_num+1]
         # Get the number of time each team had ball control
         team_1_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==1].shape[0]
         team_2_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==2].shape[0]
-        team_1 = team_1_num_frames/(team_1_num_frames+team_2_num_frames)
-        team_2 = team_2_num_frames/(team_1_num_frames+team_2_num_frames)
+        # Neither team may have had the ball yet
+        controlled_frames = max(team_1_num_frames+team_2_num_frames, 1)
+        team_1 = team_1_num_frames/controlled_frames
+        team_2 = team_2_num_frames/controlled_frames
 
         cv2.putText(frame, f"Team 1 Ball Control: {team_1*100:.2f}%",(1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
         cv2.putText(frame, f"Team 2 Ball Control: {team_2*100:.2f}%",(1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
 
         return frame
 
-    def draw_annotations(self,video_frames, tracks,team_ball_control):
+    def draw_annotations(self,video_frames, tracks,team_ball_control, start_frame=0):
+        # start_frame is the index of video_frames[0] in tracks, so the video can be drawn chunk by chunk
         output_video_frames= []
-        for frame_num, frame in enumerate(video_frames):
+        for frame_num, frame in enumerate(video_frames, start_frame):
             frame = frame.copy()
 
             player_dict = tracks["players"][frame_num]
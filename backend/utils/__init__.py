@@ -1,2 +1,4 @@
-from .video_utils import read_video, save_video
+from .video_utils import read_video, save_video, get_video_info, iter_video_frames, iter_chunks, read_video_chunks
+from .video_writer import VideoWriter
+from .stub_cache import StubCache
 from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position
\ No newline at end of file
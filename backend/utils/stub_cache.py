@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+# Bump when the on-disk layout of an entry changes so old entries are never reused
+CACHE_VERSION = 4
+
+class StubCache:
+    """
+    Content-addressed cache for detection/track and camera movement results.
+
+    Keys hash the video content, the model weights and the parameters that
+    produced a result, so renamed or re-encoded clips, new weights or a changed
+    confidence threshold never reuse stale stubs. Every entry is a directory of
+    uncompressed .npy columns that are memory mapped on load. Directory mtimes
+    record last use, and the least recently used entries are evicted once the
+    cache exceeds max_size_mb.
+    """
+
+    _file_hashes = {}
+
+    def __init__(self, stub_dir='backend/stubs', max_size_mb=2048):
+        self.stub_dir = stub_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(stub_dir, exist_ok=True)
+
+    @classmethod
+    def hash_file(cls, path, block_size=1 << 20):
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in cls._file_hashes:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    digest.update(block)
+            cls._file_hashes[memo_key] = digest.hexdigest()
+        return cls._file_hashes[memo_key]
+
+    def make_key(self, name, files=(), params=None):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{name}:{CACHE_VERSION}".encode())
+        for path in files:
+            digest.update(self.hash_file(path).encode())
+        digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+        return f"{name}_{digest.hexdigest()}"
+
+    def _entry_path(self, key):
+        return os.path.join(self.stub_dir, key)
+
+    def load(self, key, mmap_mode='r'):
+        """Return the cached columns for key as memory-mapped arrays, or None on a miss"""
+        entry_path = self._entry_path(key)
+        if not os.path.isdir(entry_path):
+            return None
+
+        try:
+            columns = {
+                file_name[:-len('.npy')]: np.load(os.path.join(entry_path, file_name), mmap_mode=mmap_mode)
+                for file_name in os.listdir(entry_path) if file_name.endswith('.npy')
+            }
+        except (OSError, ValueError) as e:
+            print(f"Discarding unreadable cache entry {key}: {e}")
+            shutil.rmtree(entry_path, ignore_errors=True)
+            return None
+
+        # Mark as recently used for LRU eviction
+        os.utime(entry_path)
+        return columns
+
+    def save(self, key, columns):
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, column in columns.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(column))
+
+        shutil.rmtree(entry_path, ignore_errors=True)
+        os.replace(tmp_path, entry_path)
+        self.enforce_size_limit(keep=entry_path)
+
+    def enforce_size_limit(self, keep=None):
+        entries = []
+        total_size = 0
+        for entry_name in os.listdir(self.stub_dir):
+            entry_path = os.path.join(self.stub_dir, entry_name)
+            if not os.path.isdir(entry_path) or '.tmp-' in entry_name or entry_path == keep:
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_path, f)) for f in os.listdir(entry_path))
+            entries.append((os.path.getmtime(entry_path), size, entry_path))
+            total_size += size
+        if keep is not None and os.path.isdir(keep):
+            total_size += sum(os.path.getsize(os.path.join(keep, f)) for f in os.listdir(keep))
+
+        # Evict least recently used entries first
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
@@ -1,4 +1,6 @@
 import cv2
+from itertools import islice
+from .video_writer import VideoWriter
 
 def read_video(video_path):
     cap = cv2.VideoCapture(video_path)
@@ -10,11 +12,45 @@ def read_video(video_path):
         frames.append(frame)
     return frames
 
-def save_video(output_video_frames, output_video_path):
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
-    for frame in output_video_frames:
-        out.write(frame)
-    out.release()
+def get_video_info(video_path):
+    cap = cv2.VideoCapture(video_path)
+    info = {
+        "fps": cap.get(cv2.CAP_PROP_FPS) or 24,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    }
+    cap.release()
+    return info
+
+def iter_video_frames(video_path, start_frame=0):
+    cap = cv2.VideoCapture(video_path)
+    if start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+def iter_chunks(frames, chunk_size):
+    # Group any iterable of frames into lists of at most chunk_size frames
+    frames = iter(frames)
+    while True:
+        chunk = list(islice(frames, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+def read_video_chunks(video_path, chunk_size=64):
+    # Only chunk_size decoded frames are alive at a time, regardless of video length
+    yield from iter_chunks(iter_video_frames(video_path), chunk_size)
+
+def save_video(output_video_frames, output_video_path, fps=24):
+    with VideoWriter(output_video_path, fps=fps) as out:
+        out.write_frames(output_video_frames)
 
-    output_video_frames.clear()
\ No newline at end of file
+    output_video_frames.clear()
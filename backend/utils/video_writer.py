@@ -0,0 +1,72 @@
+import cv2
+import queue
+import threading
+
+class VideoWriter:
+    """
+    Encodes frames on a background thread while the caller keeps producing them.
+
+    Frames go through a bounded queue, so at most queue_size annotated frames are
+    waiting to be encoded and write() blocks when the encoder falls behind.
+    """
+
+    def __init__(self, output_video_path, fps=24, frame_size=None, fourcc='XVID', queue_size=32):
+        self.output_video_path = output_video_path
+        self.fps = fps
+        # (width, height); taken from the first frame when not given
+        self.frame_size = frame_size
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.frames_written = 0
+        self.error = None
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self._encode_frames, daemon=True)
+        self.thread.start()
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(frame)
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write(frame)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _encode_frames(self):
+        out = None
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            # Keep draining after a failure so the producer never blocks on a full queue
+            if self.error is not None:
+                continue
+            try:
+                if out is None:
+                    if self.frame_size is None:
+                        self.frame_size = (frame.shape[1], frame.shape[0])
+                    out = cv2.VideoWriter(self.output_video_path, self.fourcc, self.fps, self.frame_size)
+                    if not out.isOpened():
+                        raise IOError(f"Could not open video writer for {self.output_video_path}")
+                if (frame.shape[1], frame.shape[0]) != self.frame_size:
+                    frame = cv2.resize(frame, self.frame_size)
+                out.write(frame)
+                self.frames_written += 1
+            except Exception as e:
+                self.error = e
+
+        if out is not None:
+            out.release()
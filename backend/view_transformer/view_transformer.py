@@ -1,5 +1,8 @@
 import numpy as np 
 import cv2
+import sys 
+sys.path.append('../')
+from backend.track_table import TrackTable
 
 class ViewTransformer():
     def __init__(self):
@@ -24,22 +27,60 @@ class ViewTransformer():
         self.persepctive_trasnformer = cv2.getPerspectiveTransform(self.pixel_vertices, self.target_vertices)
 
     def transform_point(self,point):
-        p = (int(point[0]),int(point[1]))
-        is_inside = cv2.pointPolygonTest(self.pixel_vertices,p,False) >= 0 
-        if not is_inside:
+        tranform_point = self.transform_points(point)
+        if np.isnan(tranform_point).any():
             return None
+        return tranform_point
 
-        reshaped_point = point.reshape(-1,1,2).astype(np.float32)
-        tranform_point = cv2.perspectiveTransform(reshaped_point,self.persepctive_trasnformer)
-        return tranform_point.reshape(-1,2)
-
-    def add_transformed_position_to_tracks(self,tracks):
-        for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    position = track_info['position_adjusted']
-                    position = np.array(position)
-                    position_trasnformed = self.transform_point(position)
-                    if position_trasnformed is not None:
-                        position_trasnformed = position_trasnformed.squeeze().tolist()
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed
\ No newline at end of file
+    def points_inside(self,points):
+        # Vectorized cv2.pointPolygonTest(...) >= 0 on integer-truncated points, edges included
+        p = np.trunc(points).astype(np.float64)
+        px, py = p[:,0], p[:,1]
+        vertices = self.pixel_vertices.astype(np.float64)
+        inside = np.zeros(len(p), dtype=bool)
+        on_edge = np.zeros(len(p), dtype=bool)
+        for (x1,y1),(x2,y2) in zip(vertices, np.roll(vertices,-1,axis=0)):
+            cross = (x2-x1)*(py-y1) - (y2-y1)*(px-x1)
+            within = (np.minimum(x1,x2) <= px) & (px <= np.maximum(x1,x2)) & (np.minimum(y1,y2) <= py) & (py <= np.maximum(y1,y2))
+            on_edge |= (cross == 0) & within
+            crosses = (y1 > py) != (y2 > py)
+            x_cross = x1 + (py-y1)*(x2-x1)/np.where(y2 != y1, y2-y1, 1)
+            inside ^= crosses & (px < x_cross)
+        return inside | on_edge
+
+    def transform_points(self,points):
+        # Returns an (n,2) array of court positions, NaN for points outside the pitch polygon
+        # The polygon test truncates the float64 points, only perspectiveTransform gets float32
+        points = np.asarray(points, dtype=np.float64).reshape(-1,2)
+        transformed = np.full(points.shape, np.nan, dtype=np.float32)
+        valid = ~np.isnan(points).any(axis=1)
+        valid[valid] = self.points_inside(points[valid])
+        if valid.any():
+            transformed[valid] = cv2.perspectiveTransform(points[valid].reshape(-1,1,2).astype(np.float32),self.persepctive_trasnformer).reshape(-1,2)
+        return transformed
+
+    def add_transformed_position_to_rows(self,rows,chunk_size=65536):
+        # One polygon test and one perspectiveTransform per chunk_size positions
+        positions = rows['position_adjusted']
+        transformed = rows['position_transformed']
+        for start in range(0, len(positions), chunk_size):
+            transformed[start:start+chunk_size] = self.transform_points(positions[start:start+chunk_size])
+
+    def add_transformed_position_to_tracks(self,tracks,chunk_size=65536):
+        if isinstance(tracks, TrackTable):
+            self.add_transformed_position_to_rows(tracks.data, chunk_size)
+            tracks.computed.add('position_transformed')
+            return
+
+        track_infos = [track_info
+                       for object_tracks in tracks.values()
+                       for track in object_tracks
+                       for track_info in track.values()]
+        for start in range(0, len(track_infos), chunk_size):
+            chunk = track_infos[start:start+chunk_size]
+            positions = [track_info['position_adjusted'] for track_info in chunk]
+            positions = np.array([position if position is not None else (np.nan, np.nan) for position in positions], dtype=np.float64)
+            transformed = self.transform_points(positions)
+            valid = ~np.isnan(transformed).any(axis=1)
+            for track_info, position_trasnformed, is_valid in zip(chunk, transformed.tolist(), valid.tolist()):
+                track_info['position_transformed'] = position_trasnformed if is_valid else None
\ No newline at end of file
@@ -10,13 +10,7 @@ import gc
 import matplotlib.pyplot as plt
 
 # Import backend processing functions
-from backend.utils import read_video, save_video
-from backend.trackers import Tracker
-from backend.team_assigner import TeamAssigner
-from backend.player_ball_assigner import PlayerBallAssigner
-from backend.camera_movement_estimator import CameraMovementEstimator
-from backend.view_transformer import ViewTransformer
-from backend.speed_and_distance_estimator import SpeedAndDistance_Estimator
+from backend.pipeline import VideoAnalysisPipeline
 from backend.statistics_calculator import StatisticsCalculator
 import numpy as np
 
@@ -117,111 +111,10 @@ def run_analysis():
 
     def analysis_thread():
         try:
-            # Read video frames
-            video_frames = read_video(video_path)
-
-            # Extract base name of the selected video file (without extension)
-            video_base_name = Path(video_path).stem
-
-            # Define the stub paths based on the video file name
-            track_stub_path = f'backend/stubs/{video_base_name}_track_stubs.pkl'
-            camera_movement_stub_path = f'backend/stubs/{video_base_name}_camera_movement_stub.pkl'
-
-            # Initialize Tracker
-            tracker = Tracker('backend/models/football-player-detection.pt')
-
-            tracks = tracker.get_object_tracks(video_frames,
-                                            read_from_stub=True,
-                                            stub_path=track_stub_path)
-            # Get object positions
-            tracker.add_position_to_tracks(tracks)
-
-            # Camera movement estimator
-            camera_movement_estimator = CameraMovementEstimator(video_frames[0])
-            camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
-                                                                                    read_from_stub=True,
-                                                                                    stub_path=camera_movement_stub_path)
-            camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
-
-            # View Trasnformer
-            view_transformer = ViewTransformer()
-            view_transformer.add_transformed_position_to_tracks(tracks)
-
-            # Interpolate Ball Positions
-            tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
-
-            # Speed and distance estimator
-            speed_and_distance_estimator = SpeedAndDistance_Estimator()
-            speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
-
-            # Assign Player Teams
-            team_assigner = TeamAssigner()
-            team_assigner.assign_team_color(video_frames[0], 
-                                            tracks['players'][0])
-            
-            for frame_num, player_track in enumerate(tracks['players']):
-                for player_id, track in player_track.items():
-                    team = team_assigner.get_player_team(video_frames[frame_num],   
-                                                        track['bbox'],
-                                                        player_id)
-                    tracks['players'][frame_num][player_id]['team'] = team 
-                    tracks['players'][frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
-
-            # Assign Ball Aquisition
-            player_assigner = PlayerBallAssigner()
-            team_ball_control = []
-            
-            # Find the first frame where the player has the ball and initialize the initial state
-            initial_frame = 0
-            current_possession = None
-            
-            # Find the initial ball control state in the first 10 frames
-            for frame_num in range(min(10, len(tracks['players']))):
-                ball_bbox = tracks['ball'][frame_num][1]['bbox']
-                assigned_player = player_assigner.assign_ball_to_player(tracks['players'][frame_num], ball_bbox)
-                
-                if assigned_player != -1:
-                    current_possession = tracks['players'][frame_num][assigned_player]['team']
-                    initial_frame = frame_num
-                    break
-            
-            # Fill frames from start to found frame
-            team_ball_control.extend([current_possession] * (initial_frame + 1))
-            
-            # Process remaining frames with small buffers to avoid sudden changes
-            possession_buffer = []
-            BUFFER_SIZE = 3
-            
-            for frame_num in range(initial_frame + 1, len(tracks['players'])):
-                ball_bbox = tracks['ball'][frame_num][1]['bbox']
-                assigned_player = player_assigner.assign_ball_to_player(tracks['players'][frame_num], ball_bbox)
-
-                if assigned_player != -1:
-                    tracks['players'][frame_num][assigned_player]['has_ball'] = True
-                    new_possession = tracks['players'][frame_num][assigned_player]['team']
-                    possession_buffer.append(new_possession)
-                else:
-                    possession_buffer.append(current_possession)
-                    
-                # Only update possession when buffer is large enough and consistent
-                if len(possession_buffer) >= BUFFER_SIZE:
-                    most_common = max(set(possession_buffer), key=possession_buffer.count)
-                    if possession_buffer.count(most_common) >= BUFFER_SIZE - 1:
-                        current_possession = most_common
-                    possession_buffer.pop(0)
-                    
-                team_ball_control.append(current_possession)
-            
-            # Convert to numpy array for more efficient processing
-            team_ball_control = np.array(team_ball_control)
-
-            # Draw annotations
-            output_video_frames = tracker.draw_annotations(video_frames, tracks, team_ball_control)
-            output_video_frames = camera_movement_estimator.draw_camera_movement(output_video_frames, camera_movement_per_frame)
-            speed_and_distance_estimator.draw_speed_and_distance(output_video_frames, tracks)
-
-            # Save output video
-            save_video(output_video_frames, output_video_path)
+            # Decode, detection, tracking, annotation and encoding run as concurrent pipeline stages
+            video_analysis = VideoAnalysisPipeline('backend/models/football-player-detection.pt',
+                                                   stub_dir='backend/stubs')
+            tracks, team_ball_control = video_analysis.run(video_path, output_video_path)
 
             # Calculate statistics
             statistics_calculator = StatisticsCalculator()
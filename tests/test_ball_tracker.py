@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.ball_tracker import fill_gaps
+
+def fill_gaps_loop(bboxes, max_gap):
+    # Reference: fill every run of missing boxes of at most max_gap frames
+    bboxes = np.array(bboxes, dtype=np.float64)
+    filled = bboxes.copy()
+    missing = np.isnan(bboxes).any(axis=1)
+    known = np.flatnonzero(~missing)
+    frame_num = 0
+    while frame_num < len(bboxes):
+        if not missing[frame_num]:
+            frame_num += 1
+            continue
+        gap_end = frame_num
+        while gap_end < len(bboxes) and missing[gap_end]:
+            gap_end += 1
+        if gap_end - frame_num <= max_gap and len(known):
+            before, after = frame_num - 1, gap_end
+            for i in range(frame_num, gap_end):
+                if before < 0:
+                    filled[i] = bboxes[after]
+                elif after >= len(bboxes):
+                    filled[i] = bboxes[before]
+                else:
+                    t = (i - before) / (after - before)
+                    filled[i] = bboxes[before] + t * (bboxes[after] - bboxes[before])
+        frame_num = gap_end
+    return filled
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fill_gaps_matches_pandas(seed):
+    rng = np.random.default_rng(seed)
+    bboxes = rng.uniform(0, 1000, (200, 4))
+    bboxes[rng.random(200) < 0.4] = np.nan
+    expected = pd.DataFrame(bboxes).interpolate().bfill().to_numpy()
+    filled, estimated = fill_gaps(bboxes)
+    np.testing.assert_allclose(filled, expected)
+    np.testing.assert_array_equal(estimated, np.isnan(bboxes).any(axis=1))
+
+@pytest.mark.parametrize("max_gap", [0, 1, 3, 10])
+def test_fill_gaps_max_gap_matches_loop(max_gap):
+    rng = np.random.default_rng(max_gap)
+    bboxes = rng.uniform(0, 1000, (300, 4))
+    bboxes[rng.random(300) < 0.5] = np.nan
+    bboxes[:4] = np.nan
+    bboxes[-7:] = np.nan
+    expected = fill_gaps_loop(bboxes, max_gap)
+    filled, estimated = fill_gaps(bboxes, max_gap=max_gap)
+    np.testing.assert_allclose(filled, expected, equal_nan=True)
+    np.testing.assert_array_equal(estimated, np.isnan(bboxes).any(axis=1) & ~np.isnan(expected).any(axis=1))
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+
+from backend.camera_movement_estimator import CameraMovementEstimator, ParallelCameraMovement
+from backend.camera_movement_estimator.feature_tracks import FeatureTracks
+
+def make_pan(num_frames=12, step=(8, 3), seed=0):
+    """Frames cut from a blurred noise texture moving by step pixels per frame, and the true movement"""
+    rng = np.random.default_rng(seed)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (600, 900), dtype=np.uint8), (0, 0), 1.5)
+    texture = cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+    frames = []
+    for frame_num in range(num_frames):
+        x, y = 20 + step[0] * frame_num, 20 + step[1] * frame_num
+        frames.append(cv2.cvtColor(texture[y:y+270, x:x+480], cv2.COLOR_GRAY2BGR))
+    movement = np.tile(np.array(step, dtype=np.float64), (num_frames, 1))
+    movement[0] = 0
+    return frames, movement
+
+def test_get_camera_movement_starts_fresh_on_every_call():
+    frames, movement = make_pan()
+    estimator = CameraMovementEstimator(frames[0], "median")
+    first = estimator.get_camera_movement(frames)
+    second = estimator.get_camera_movement(frames[4:])
+    np.testing.assert_allclose(first[1:], movement[1:], atol=1)
+    np.testing.assert_array_equal(second, CameraMovementEstimator(frames[0], "median").get_camera_movement(frames[4:]))
+
+def test_robust_estimators_ignore_outlier_features():
+    frames, _ = make_pan(1)
+    rng = np.random.default_rng(1)
+    old_points = rng.uniform(0, 480, (60, 2))
+    new_points = old_points - [6.0, -4.0] + rng.normal(0, 0.2, (60, 2))
+    # A quarter of the features sit on players running across the frame
+    new_points[:15] += rng.uniform(20, 60, (15, 2))
+
+    distance, movement = CameraMovementEstimator(frames[0], "max").estimate_movement(old_points, new_points)
+    assert distance > 20
+
+    for estimator in ("median", "ransac"):
+        distance, movement = CameraMovementEstimator(frames[0], estimator).estimate_movement(old_points, new_points)
+        np.testing.assert_allclose(movement, [6.0, -4.0], atol=0.3)
+        assert abs(distance - np.hypot(6.0, -4.0)) < 0.3
+
+def test_feature_tracks_drop_points_that_do_not_track_back():
+    rng = np.random.default_rng(2)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (400, 600), dtype=np.uint8), (0, 0), 1.5)
+    texture = cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+    previous = texture[50:350, 50:550].copy()
+    frame = texture[53:353, 55:555].copy()
+    # Unrelated content appears in one region, e.g. a player passing close to the camera
+    frame[100:200, 300:450] = rng.integers(0, 256, (100, 150), dtype=np.uint8)
+
+    estimator = CameraMovementEstimator(cv2.cvtColor(previous, cv2.COLOR_GRAY2BGR))
+    grid = np.stack(np.meshgrid(np.arange(40, 460, 20), np.arange(40, 260, 20)), axis=-1).reshape(-1, 1, 2).astype(np.float32)
+    near_change = lambda points: (points[:, 0] > 290) & (points[:, 0] < 460) & (points[:, 1] > 90) & (points[:, 1] < 210)
+
+    errors = {}
+    for max_fb_error in (1.0, np.inf):
+        feature_tracks = FeatureTracks(estimator.features, estimator.lk_params, min_features=1, max_fb_error=max_fb_error)
+        feature_tracks.points = grid
+        old_points, new_points = feature_tracks.track(previous, frame)
+        errors[max_fb_error] = np.linalg.norm(old_points - new_points - [5, 3], axis=1)
+        # Points away from the change always survive and follow the camera
+        assert (~near_change(old_points)).sum() == (~near_change(grid.reshape(-1, 2))).sum()
+        assert errors[max_fb_error][~near_change(old_points)].max() < 0.05
+
+    assert (errors[1.0] > 1).sum() * 3 <= (errors[np.inf] > 1).sum()
+
+def test_parallel_camera_movement_matches_serial():
+    frames, movement = make_pan(24)
+    serial = CameraMovementEstimator(frames[0], "median").get_camera_movement(frames)
+    parallel = CameraMovementEstimator(frames[0], "median").get_camera_movement(frames, chunk_size=8, num_workers=2)
+    assert parallel.shape == serial.shape == (24, 2)
+    # Chunks restart from the last frame of the chunk before, the boundary frames 8 and 16 still move
+    np.testing.assert_allclose(parallel, serial, atol=0.5)
+    np.testing.assert_allclose(parallel, movement, atol=1)
+
+def test_parallel_camera_movement_collects_finished_chunks_in_order():
+    frames, _ = make_pan(20)
+    estimator = CameraMovementEstimator(frames[0], "median")
+    with ParallelCameraMovement(estimator, num_workers=2, chunk_size=8) as parallel_camera_movement:
+        collected = []
+        for start in range(0, 20, 5):
+            parallel_camera_movement.submit(frames[start:start + 5])
+            collected.append(parallel_camera_movement.collect(start + 5))
+        # Frames still gathering into a chunk only come out once the last one is dispatched
+        assert [len(movement) for movement in collected] == [0, 8, 0, 8]
+        collected.append(parallel_camera_movement.collect())
+        np.testing.assert_array_equal(np.concatenate(collected), parallel_camera_movement.result())
+    assert len(np.concatenate(collected)) == 20
@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+import supervision as sv
+from backend.trackers.keyframe_detector import KeyframeDetector
+
+OFF_FRAME_BOX = [-200.0, -200.0, -100.0, -100.0]
+
+def noise_texture(shape, seed):
+    texture = cv2.GaussianBlur(np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8), (0, 0), 1.5)
+    return cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+
+def make_clip(num_frames=9, step=(4, 2), size=60):
+    """Textured square moving by step pixels per frame over a static textured pitch, and its true boxes"""
+    background, patch = noise_texture((270, 480), 0), noise_texture((size, size), 1)
+    frames, boxes = [], []
+    for frame_num in range(num_frames):
+        x, y = 100 + step[0] * frame_num, 80 + step[1] * frame_num
+        frame = background.copy()
+        frame[y:y+size, x:x+size] = patch
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+        boxes.append([x, y, x + size, y + size])
+    return frames, np.array(boxes, dtype=np.float32)
+
+class FakeDetector:
+    """Returns the true box of every frame it is given and records which frames those were"""
+    def __init__(self, frames, boxes, extra_boxes=()):
+        self.index = {id(frame): frame_num for frame_num, frame in enumerate(frames)}
+        self.boxes = boxes
+        self.extra_boxes = list(extra_boxes)
+        self.detected = []
+
+    def __call__(self, frames):
+        results = []
+        for frame in frames:
+            frame_num = self.index[id(frame)]
+            self.detected.append(frame_num)
+            xyxy = np.array([self.boxes[frame_num].tolist()] + self.extra_boxes, dtype=np.float32)
+            results.append(sv.Detections(xyxy=xyxy, class_id=np.full(len(xyxy), 2)))
+        return results
+
+def detect_in_chunks(detector, frames, chunk_sizes):
+    detections, start = [], 0
+    for chunk_size in chunk_sizes:
+        detections += detector.detect_frames(frames[start:start + chunk_size])
+        start += chunk_size
+    return detections
+
+def test_keyframes_keep_their_cadence_across_chunks():
+    frames, boxes = make_clip()
+    fake = FakeDetector(frames, boxes)
+    detector = KeyframeDetector(fake, keyframe_interval=3, motion_threshold=255)
+    detections = detect_in_chunks(detector, frames, [5, 4])
+    assert fake.detected == [0, 3, 6]
+    assert detector.stats == {"detected": 3, "propagated": 6, "forced": 0}
+    assert len(detections) == len(frames)
+
+def test_propagated_boxes_follow_the_object():
+    frames, boxes = make_clip()
+    detector = KeyframeDetector(FakeDetector(frames, boxes), keyframe_interval=100, motion_threshold=255)
+    detections = detector.detect_frames(frames)
+    assert detector.stats["propagated"] == len(frames) - 1
+    for frame_detections, box in zip(detections, boxes):
+        assert len(frame_detections) == 1
+        np.testing.assert_allclose(frame_detections.xyxy[0], box, atol=1)
+
+def test_cut_is_detected_as_a_keyframe():
+    frames, boxes = make_clip()
+    frames[5] = cv2.cvtColor(noise_texture((270, 480), 2), cv2.COLOR_GRAY2BGR)
+    fake = FakeDetector(frames, boxes)
+    detector = KeyframeDetector(fake, keyframe_interval=100)
+    detector.detect_frames(frames)
+    assert fake.detected == [0, 5, 6]
+
+def test_losing_boxes_forces_a_detection():
+    frames, boxes = make_clip(num_frames=4)
+    fake = FakeDetector(frames, boxes, extra_boxes=[OFF_FRAME_BOX])
+    detector = KeyframeDetector(fake, keyframe_interval=100, motion_threshold=255, max_lost_fraction=0.3)
+    detections = detector.detect_frames(frames)
+    assert fake.detected == [0, 1, 2, 3]
+    assert detector.stats == {"detected": 4, "propagated": 0, "forced": 3}
+    assert all(len(frame_detections) == 2 for frame_detections in detections)
+
+    # Below the limit the lost box is only dropped
+    fake = FakeDetector(frames, boxes, extra_boxes=[OFF_FRAME_BOX])
+    detector = KeyframeDetector(fake, keyframe_interval=100, motion_threshold=255, max_lost_fraction=0.6)
+    detections = detector.detect_frames(frames)
+    assert fake.detected == [0]
+    assert [len(frame_detections) for frame_detections in detections] == [2, 1, 1, 1]
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+import supervision as sv
+
+pytest.importorskip("ultralytics")
+from backend.trackers import PitchROI
+
+def make_frame(frame_num):
+    """Grass below a moving far line, with one white player box"""
+    frame = np.full((720, 1280, 3), 40, dtype=np.uint8)
+    frame[200 + 10 * (frame_num % 5):, 50:1230] = (40, 160, 40)
+    cv2.rectangle(frame, (300 + 7 * frame_num, 400), (330 + 7 * frame_num, 460), (255, 255, 255), -1)
+    return frame
+
+def find_white_boxes(images):
+    # Stands in for the detector: one box around the white pixels of every image
+    detections = []
+    for image in images:
+        ys, xs = np.nonzero((image == 255).all(axis=2))
+        xyxy = np.array([[xs.min(), ys.min(), xs.max(), ys.max()]], dtype=np.float32)
+        detections.append(sv.Detections(xyxy=xyxy, confidence=np.ones(1, dtype=np.float32), class_id=np.zeros(1, dtype=int)))
+    return detections
+
+def test_detections_do_not_depend_on_the_batch():
+    frames = [make_frame(frame_num) for frame_num in range(12)]
+    batched = PitchROI().detect(find_white_boxes, frames)
+    single = [PitchROI().detect(find_white_boxes, [frame])[0] for frame in frames]
+    for frame_num, (a, b) in enumerate(zip(batched, single)):
+        np.testing.assert_array_equal(a.xyxy, b.xyxy)
+        np.testing.assert_array_equal(a.xyxy[0], [300 + 7 * frame_num, 400, 330 + 7 * frame_num, 460])
+
+def test_stats_count_letterboxed_detector_input():
+    roi = PitchROI()
+    frame = make_frame(0)
+    roi.detect(find_white_boxes, [frame])
+    x1, y1, x2, y2 = roi.crop_box([roi.mask(frame)], frame.shape)
+    # 1280x720 is letterboxed to 640x384, the crop keeps the width and loses the stands
+    assert roi.stats["pixels"] == 640 * 384
+    assert roi.stats["pixels_inferred"] == roi.letterboxed_pixels(y2 - y1, x2 - x1) < 640 * 384
@@ -0,0 +1,51 @@
+import os
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+from ultralytics import YOLO
+import supervision as sv
+from backend.trackers import ShardedDetector, Tracker
+from backend.utils import iter_chunks
+
+MODEL_PATH = 'backend/models/football-player-detection.pt'
+
+pytestmark = pytest.mark.skipif(not os.path.exists(MODEL_PATH), reason=f"needs the detector weights in {MODEL_PATH}")
+
+def make_frames(num_frames=10):
+    """Grass with a few player-sized blobs walking across it"""
+    frames = []
+    for frame_num in range(num_frames):
+        frame = np.full((360, 640, 3), (40, 140, 40), dtype=np.uint8)
+        for i, color in enumerate([(255, 255, 255), (30, 30, 200), (200, 60, 30), (20, 20, 20)]):
+            x, y = 60 + 130 * i + 6 * frame_num, 120 + 25 * i
+            cv2.rectangle(frame, (x, y), (x + 22, y + 55), color, -1)
+            cv2.circle(frame, (x + 11, y - 8), 8, (120, 160, 210), -1)
+        frames.append(frame)
+    return frames
+
+def test_sharded_detections_match_serial_detection():
+    frames = make_frames()
+    serial = [sv.Detections.from_ultralytics(result)
+              for result in YOLO(MODEL_PATH, task='detect').predict(frames, conf=0.1, device='cpu', verbose=False)]
+    with ShardedDetector(MODEL_PATH, num_workers=2, conf=0.1) as detector:
+        sharded = [detections for chunk in detector.detect_chunks(iter_chunks(frames, 3)) for detections in chunk]
+
+    assert len(sharded) == len(serial)
+    for a, b in zip(sharded, serial):
+        np.testing.assert_allclose(a.xyxy, b.xyxy, atol=1e-3)
+        np.testing.assert_array_equal(a.class_id, b.class_id)
+
+def test_sharded_tracks_match_serial_tracks():
+    serial_tracker = Tracker(MODEL_PATH)
+    if serial_tracker.device != 'cpu':
+        pytest.skip("the workers detect on the CPU, serial detection runs on an accelerator here")
+    frames = make_frames()
+    serial = serial_tracker.get_object_tracks(frames, chunk_size=3)
+    sharded = Tracker(MODEL_PATH).get_object_tracks(frames, chunk_size=3, num_workers=2)
+
+    assert serial.num_frames == sharded.num_frames
+    for field in ("object", "frame", "track_id"):
+        np.testing.assert_array_equal(sharded.data[field], serial.data[field])
+    np.testing.assert_allclose(sharded.data["bbox"], serial.data["bbox"], atol=1e-3)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from backend.track_table import TrackTable, add_position_to_tracks, make_rows
+from backend.ball_tracker import BallTracker
+from backend.camera_movement_estimator import CameraMovementEstimator
+from backend.view_transformer import ViewTransformer
+from backend.speed_and_distance_estimator import SpeedAndDistance_Estimator
+from backend.player_ball_assigner import PlayerBallAssigner
+from backend.frame_annotator import HudTimeline
+from backend.track_enricher import TrackEnricher
+
+NUM_FRAMES = 120
+MAX_GAP = 8
+
+def make_rows_and_movement(seed=0):
+    """Tracked rows of two teams passing a ball around, with ball gaps shorter and longer than MAX_GAP"""
+    rng = np.random.default_rng(seed)
+    players, ball = TrackTable.object_index("players"), TrackTable.object_index("ball")
+    starts = rng.uniform([400, 400], [1300, 800], (10, 2))
+    velocities = rng.uniform(-3, 3, (10, 2))
+    rows = []
+    for frame_num in range(NUM_FRAMES):
+        visible = np.flatnonzero(rng.random(10) < 0.9)
+        feet = starts[visible] + velocities[visible] * frame_num
+        bboxes = np.column_stack([feet[:, 0] - 15, feet[:, 1] - 60, feet[:, 0] + 15, feet[:, 1]])
+        player_rows = make_rows(players, np.full(len(visible), frame_num), visible + 1, bboxes)
+        player_rows["team"] = visible % 2 + 1
+        rows.append(player_rows)
+        # The ball sits at the feet of a different player every 15 frames, but away from everyone
+        # at first, so the initial ball control is only found a few frames in
+        carrier = starts[frame_num // 15 % 10] + velocities[frame_num // 15 % 10] * frame_num
+        if frame_num < 6:
+            carrier = np.array([200.0, 900.0])
+        if not (30 <= frame_num < 35 or 60 <= frame_num < 72 or rng.random() < 0.1):
+            rows.append(make_rows(ball, [frame_num], 1, [[carrier[0] - 5, carrier[1] - 10, carrier[0] + 5, carrier[1]]]))
+    return np.concatenate(rows), rng.uniform(-5, 5, (NUM_FRAMES, 2))
+
+def enrich_whole_table(rows, camera_movement):
+    tracks = TrackTable(rows.copy(), NUM_FRAMES)
+    BallTracker(max_gap=MAX_GAP).add_ball_positions_to_tracks(tracks)
+    add_position_to_tracks(tracks)
+    CameraMovementEstimator.add_adjust_positions_to_tracks(None, tracks, camera_movement)
+    ViewTransformer().add_transformed_position_to_tracks(tracks)
+    SpeedAndDistance_Estimator().add_speed_and_distance_to_tracks(tracks)
+    team_ball_control = PlayerBallAssigner().assign_team_ball_control(tracks)
+    return tracks, team_ball_control, HudTimeline(team_ball_control, camera_movement, tracks)
+
+def enrich_streaming(rows, camera_movement, seed):
+    rng = np.random.default_rng(seed)
+    enricher = TrackEnricher(max_gap=MAX_GAP)
+    frames = list(range(NUM_FRAMES))
+    outputs, start_frame, camera_known = [], 0, 0
+    while start_frame < NUM_FRAMES:
+        stop_frame = min(start_frame + int(rng.integers(1, 13)), NUM_FRAMES)
+        # Camera movement lags behind like with ParallelCameraMovement
+        camera_stop = max(camera_known, stop_frame - int(rng.integers(0, 20)))
+        chunk_rows = rows[(rows["frame"] >= start_frame) & (rows["frame"] < stop_frame)]
+        outputs.append(enricher.add(start_frame, frames[start_frame:stop_frame], chunk_rows,
+                                    camera_movement[camera_known:camera_stop]))
+        start_frame, camera_known = stop_frame, camera_stop
+    outputs.append(enricher.finish(camera_movement[camera_known:]))
+    return enricher, [output for output in outputs if output is not None]
+
+@pytest.mark.parametrize("seed", range(4))
+def test_streaming_enrichment_matches_whole_table(seed):
+    rows, camera_movement = make_rows_and_movement()
+    expected, team_ball_control, hud_timeline = enrich_whole_table(rows, camera_movement)
+    enricher, outputs = enrich_streaming(rows, camera_movement, seed)
+
+    # Every frame comes out once, in order, with a table of just its range
+    assert [frame for _, frames, _ in outputs for frame in frames] == list(range(NUM_FRAMES))
+    for start_frame, frames, table in outputs:
+        assert table.start_frame == start_frame and table.num_frames == len(frames)
+        for object_name in expected:
+            np.testing.assert_array_equal(table.rows(object_name, start_frame, start_frame + len(frames))["frame"],
+                                          expected.rows(object_name, start_frame, start_frame + len(frames))["frame"])
+
+    actual = enricher.build()
+    assert actual.num_frames == NUM_FRAMES
+    for field in ("object", "frame", "track_id", "team", "has_ball", "estimated"):
+        np.testing.assert_array_equal(actual.data[field], expected.data[field], err_msg=field)
+    for field in ("bbox", "position", "position_adjusted", "position_transformed", "speed"):
+        np.testing.assert_array_equal(actual.data[field], expected.data[field], err_msg=field)
+    np.testing.assert_allclose(actual.data["distance"], expected.data["distance"], rtol=1e-6)
+    assert np.isfinite(expected.data["speed"]).any()
+
+    np.testing.assert_array_equal(np.array(enricher.team_ball_control), team_ball_control)
+    np.testing.assert_array_equal(enricher.hud_timeline.ball_control, hud_timeline.ball_control)
+    np.testing.assert_array_equal(enricher.hud_timeline.total_camera_movement, hud_timeline.total_camera_movement)
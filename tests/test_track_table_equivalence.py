@@ -0,0 +1,123 @@
+import copy
+import cv2
+import numpy as np
+import pytest
+
+from backend.track_table import TrackTable, add_position_to_tracks
+from backend.ball_tracker import fill_gaps
+from backend.camera_movement_estimator.camera_movement_estimator import CameraMovementEstimator
+from backend.view_transformer import ViewTransformer
+from backend.speed_and_distance_estimator import SpeedAndDistance_Estimator
+
+NUM_FRAMES = 60
+
+def make_tracks(seed=0):
+    """Dict tracks with float64 boxes, including boxes whose float32 rounding crosses an integer"""
+    rng = np.random.default_rng(seed)
+    tracks = {"players": [], "referees": [], "ball": []}
+    for frame_num in range(NUM_FRAMES):
+        players = {}
+        for track_id in range(1, 15):
+            if rng.random() < 0.9:
+                x1, y1 = rng.uniform(0, 1800), rng.uniform(200, 1000)
+                players[track_id] = {"bbox": [x1, y1, x1 + rng.uniform(20, 60), y1 + rng.uniform(40, 80)]}
+        # x1+x2 and y2 just below an integer in float64, rounded up to it in float32
+        players[20] = {"bbox": [600.0, 500.0, 700.0 - 1e-6, 600.0 - 1e-6]}
+        players[21] = {"bbox": [1100.25, 610.5, 1150.75 - 2e-6, 699.9999999]}
+        tracks["players"].append(players)
+        tracks["referees"].append({7: {"bbox": [900.0 + frame_num, 400.0, 930.5 + frame_num, 480.3]}})
+
+    # Interpolated ball boxes are float64, like after fill_gaps in the pipeline
+    ball = np.column_stack([np.linspace(300, 1500, NUM_FRAMES), np.linspace(600, 400, NUM_FRAMES)])
+    ball = np.hstack([ball, ball + 11.3])
+    ball[rng.random(NUM_FRAMES) < 0.3] = np.nan
+    ball, _ = fill_gaps(ball)
+    tracks["ball"] = [{1: {"bbox": bbox}} for bbox in ball.tolist()]
+    return tracks
+
+def camera_movement(seed=0):
+    return np.random.default_rng(seed).uniform(-5, 5, (NUM_FRAMES, 2))
+
+def transform_point_loop(view_transformer, point):
+    # The per-point ViewTransformer.transform_point the batched version replaced
+    point = np.array(point)
+    p = (int(point[0]), int(point[1]))
+    if cv2.pointPolygonTest(view_transformer.pixel_vertices, p, False) < 0:
+        return None
+    transformed = cv2.perspectiveTransform(point.reshape(-1,1,2).astype(np.float32),
+                                           view_transformer.persepctive_trasnformer)
+    return transformed.reshape(-1,2).squeeze().tolist()
+
+def transform_loop(view_transformer, tracks):
+    for object_tracks in tracks.values():
+        for track in object_tracks:
+            for track_info in track.values():
+                track_info['position_transformed'] = transform_point_loop(view_transformer, track_info['position_adjusted'])
+
+def enrich(tracks, transform):
+    add_position_to_tracks(tracks)
+    CameraMovementEstimator.add_adjust_positions_to_tracks(None, tracks, camera_movement())
+    transform(ViewTransformer(), tracks)
+    SpeedAndDistance_Estimator().add_speed_and_distance_to_tracks(tracks)
+
+def run_both(transform_dict):
+    tracks = make_tracks()
+    table = TrackTable.from_dict(copy.deepcopy(tracks), NUM_FRAMES)
+    enrich(tracks, transform_dict)
+    enrich(table, ViewTransformer.add_transformed_position_to_tracks)
+    return tracks, table.to_dict()
+
+def assert_tracks_equal(expected, actual):
+    for object, object_tracks in expected.items():
+        for frame_num, track in enumerate(object_tracks):
+            assert set(track) == set(actual[object][frame_num])
+            for track_id, track_info in track.items():
+                row = actual[object][frame_num][track_id]
+                assert tuple(row['position']) == tuple(track_info['position'])
+                np.testing.assert_allclose(row['position_adjusted'], track_info['position_adjusted'], rtol=0, atol=1e-9)
+                if track_info['position_transformed'] is None:
+                    assert row['position_transformed'] is None
+                else:
+                    np.testing.assert_array_equal(np.float32(row['position_transformed']),
+                                                  np.float32(track_info['position_transformed']))
+                assert ('speed' in row) == ('speed' in track_info)
+                if 'speed' in track_info:
+                    np.testing.assert_allclose(row['speed'], track_info['speed'], rtol=1e-5)
+                    np.testing.assert_allclose(row['distance'], track_info['distance'], rtol=1e-5)
+
+def test_table_enrichment_matches_dict_loops():
+    expected, actual = run_both(transform_loop)
+    assert_tracks_equal(expected, actual)
+
+def test_batched_dict_transform_matches_point_loop():
+    tracks = make_tracks()
+    for transform in (transform_loop, ViewTransformer.add_transformed_position_to_tracks):
+        enrich(tracks, transform)
+        if transform is transform_loop:
+            expected = copy.deepcopy(tracks)
+    assert_tracks_equal(expected, tracks)
+
+def test_transform_points_matches_point_loop_at_polygon_vertex():
+    view_transformer = ViewTransformer()
+    # Truncates to x=264 (outside) in float64 but to the vertex x=265 (on the edge) in float32
+    points = np.array([[265 - 1e-7, 275.0], [265.0, 275.0], [500.3, 600.7], [50.0, 50.0]])
+    transformed = view_transformer.transform_points(points)
+    for point, actual in zip(points, transformed):
+        expected = transform_point_loop(view_transformer, point)
+        if expected is None:
+            assert np.isnan(actual).all()
+        else:
+            np.testing.assert_array_equal(actual, np.float32(expected))
+
+def test_table_position_matches_tracker():
+    pytest.importorskip("ultralytics")
+    from backend.trackers import Tracker
+    tracks = make_tracks()
+    table = TrackTable.from_dict(copy.deepcopy(tracks), NUM_FRAMES)
+    Tracker.add_position_to_tracks(None, tracks)
+    Tracker.add_position_to_tracks(None, table)
+    actual = table.to_dict()
+    for object, object_tracks in tracks.items():
+        for frame_num, track in enumerate(object_tracks):
+            for track_id, track_info in track.items():
+                assert tuple(actual[object][frame_num][track_id]['position']) == tuple(track_info['position'])